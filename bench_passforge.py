@@ -0,0 +1,107 @@
+# bench_passforge.py
+"""Reproducible benchmark suite for the PassForge generation pipeline.
+
+Runs fixed synthetic target profiles through PasswordGenerator.generate() and
+reports wall time, candidate counts and (optionally) tracemalloc peak memory.
+Save results with --json and compare a later run against them with --baseline
+to spot performance regressions between versions.
+"""
+import argparse
+import json
+import logging
+import os
+import random
+import statistics
+import sys
+import tempfile
+import time
+import tracemalloc
+
+import passforge
+
+# --- Benchmark Profiles ---
+# Each profile is a list of passforge command-line arguments; '{keyword_file}' is
+# replaced with a synthetic keyword file generated from a fixed seed.
+PROFILES = {
+    'small': ['--first-name', 'John', '--last-name', 'Doe', '--birth-date', '1990-05-15', '--no-patterns'],
+    'medium': ['--first-name', 'John', '--last-name', 'Doe', '--username', 'jdoe', '--pet-name', 'buddy', '--company', 'Acme',
+               '--birth-date', '1990-05-15', '--leet-level', 'simple', '--reverse', '--no-numbers', '--no-symbols', '--no-dates', '--max-len', '10'],
+    'keyword-file-heavy': ['--first-name', 'John', '--birth-date', '1990-05-15', '-kF', '{keyword_file}', '--no-patterns', '--no-insertions'],
+    'full-leet': ['-k', 'illegitimate', '-k', 'basketball', '-k', 'passwords', '--leet-level', 'full', '--no-patterns', '--no-insertions'],
+}
+KEYWORD_FILE_SIZE = 200
+KEYWORD_SEED = 1337
+SYLLABLES = ['ka', 'lo', 'mi', 'ra', 'to', 'ne', 'su', 'vi', 'da', 'bel', 'mar', 'tin', 'son', 'ley', 'ar', 'en']
+
+
+def write_keyword_file(directory):
+    """Writes the deterministic synthetic keyword file and returns its path."""
+    rng = random.Random(KEYWORD_SEED)
+    words = {"".join(rng.choice(SYLLABLES) for _ in range(rng.randint(2, 4))) for _ in range(KEYWORD_FILE_SIZE * 2)}
+    path = os.path.join(directory, 'keywords.txt')
+    with open(path, 'w', encoding='utf-8') as f: f.write("\n".join(sorted(words)[:KEYWORD_FILE_SIZE]) + "\n")
+    return path
+
+
+def run_profile(argv, repeat, measure_memory):
+    """Runs one profile repeat times and returns its result record."""
+    args = passforge.build_parser().parse_args(argv)
+    times = []; count = 0; peak = None
+    for _ in range(repeat):
+        generator = passforge.PasswordGenerator(args)
+        start = time.perf_counter()
+        count = len(generator.generate())
+        times.append(time.perf_counter() - start)
+    if measure_memory: # Separate run, so tracing overhead does not skew the timings
+        generator = passforge.PasswordGenerator(args)
+        tracemalloc.start(); generator.generate()
+        peak = tracemalloc.get_traced_memory()[1]; tracemalloc.stop()
+    median = statistics.median(times)
+    return {'median_s': round(median, 6), 'min_s': round(min(times), 6), 'runs': repeat, 'candidates': count,
+            'candidates_per_s': round(count / median) if median else None, 'peak_memory_bytes': peak}
+
+
+def compare(results, baseline, threshold):
+    """Prints the change against a baseline results file. Returns True if any profile regressed."""
+    regressed = False
+    for name, result in results['profiles'].items():
+        old = baseline.get('profiles', {}).get(name)
+        if not old: print(f"{name:<20} (not in baseline)"); continue
+        change = (result['median_s'] - old['median_s']) / old['median_s'] if old['median_s'] else 0.0
+        flag = ''
+        if change > threshold: flag = '  REGRESSION'; regressed = True
+        if result['candidates'] != old['candidates']: flag += f"  (candidates {old['candidates']} -> {result['candidates']})"
+        print(f"{name:<20} {old['median_s']:>10.3f}s -> {result['median_s']:>10.3f}s  {change:+.1%}{flag}")
+    return regressed
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark the PassForge generation pipeline on fixed synthetic profiles.")
+    parser.add_argument("-p", "--profile", action='append', choices=sorted(PROFILES), help="Profile(s) to run (Default: all)")
+    parser.add_argument("-r", "--repeat", type=int, default=3, help="Runs per profile; the median is reported")
+    parser.add_argument("--memory", action="store_true", help="Also measure tracemalloc peak memory in one extra, untimed run")
+    parser.add_argument("--json", help="Write the results to this JSON file")
+    parser.add_argument("--baseline", help="Compare against a results file written earlier with --json")
+    parser.add_argument("--threshold", type=float, default=0.10, help="Relative slowdown reported as a regression")
+    args = parser.parse_args()
+
+    passforge.log.setLevel(logging.WARNING)
+    results = {'version': passforge.__version__, 'python': sys.version.split()[0], 'profiles': {}}
+    with tempfile.TemporaryDirectory(prefix='passforge-bench-') as tmpdir:
+        keyword_file = write_keyword_file(tmpdir)
+        for name in args.profile or list(PROFILES):
+            argv = [a.replace('{keyword_file}', keyword_file) for a in PROFILES[name]]
+            result = results['profiles'][name] = run_profile(argv, args.repeat, args.memory)
+            memory = f"  peak {result['peak_memory_bytes'] / 2**20:.1f} MiB" if result['peak_memory_bytes'] is not None else ''
+            print(f"{name:<20} {result['median_s']:>10.3f}s  {result['candidates']:>10} candidates  {result['candidates_per_s'] or 0:>10}/s{memory}")
+
+    if args.json:
+        with open(args.json, 'w', encoding='utf-8') as f: json.dump(results, f, indent=2); f.write("\n")
+    if args.baseline:
+        with open(args.baseline, 'r', encoding='utf-8') as f: baseline = json.load(f)
+        print(f"\nComparison with {args.baseline} (baseline version {baseline.get('version')}):")
+        if compare(results, baseline, args.threshold): sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
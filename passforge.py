@@ -1,18 +1,56 @@
 # passforge.py (v3.0)
 import argparse
+import bisect
+import bz2
+import collections
+import contextlib
+import csv
+import dataclasses
+import functools
+import gzip
+import hashlib
+import http.server
 import sys
 import os
+import heapq
 import itertools
+import json
 import logging
+import lzma
+import math
+import mmap
+import multiprocessing
 import re
+import shlex
+import shutil
 from datetime import datetime
 import string
+import struct
+import subprocess
+import tempfile
 import threading
+import time
+import tracemalloc
+import zlib
+from array import array
+from typing import List, Optional
 
 # --- Constants ---
 __version__ = "3.0"
 DEFAULT_MIN_LEN = 6
 DEFAULT_MAX_LEN = 16
+DEFAULT_CACHE_SIZE = 256 * 1024 ** 2 # Bytes of wordlists kept by the --serve result cache
+OUTPUT_BUFFER_SIZE = 1 << 20 # Bytes buffered by the output writer
+WRITE_CHUNK_LINES = 8192 # Candidates joined per write() call
+SET_ENTRY_OVERHEAD = 64 # Approximate bytes a set slot adds on top of the string object
+MAX_MERGE_FANIN = 64 # Sorted runs merged at once during external deduplication
+BLOOM_ERROR_RATE = 0.01 # Target false-positive rate of Bloom filters
+PFC_BLOCK_SIZE = 64 # Words per front-coded block in .pfc output; each block starts with a full word
+EXCLUDE_BATCH_SIZE = 4096 # Candidates looked up per sorted batch in the --exclude-wordlist index
+EXCLUDE_RUN_SIZE = 1 << 22 # Fingerprints sorted in memory per run while building an exclusion index
+AUDIT_BATCH_SIZE = 8192 # Candidates hashed per --audit-hashes task
+# --hash-type choices: plain digests, NTLM (MD4 of UTF-16LE) and salted digests of password+salt or salt+password
+AUDIT_HASH_TYPES = ('ntlm', 'md5', 'sha1', 'sha256', 'md5-pass-salt', 'md5-salt-pass', 'sha1-pass-salt', 'sha1-salt-pass', 'sha256-pass-salt', 'sha256-salt-pass')
 # Common numbers/years/symbols for affixing and patterns
 CURRENT_YEAR = datetime.now().year
 YEARS = [str(y) for y in range(CURRENT_YEAR - 5, CURRENT_YEAR + 3)]
@@ -21,40 +59,734 @@ NUMBERS_SIMPLE = ['1', '2', '3', '12', '123', '1234', '0', '007']
 NUMBERS_ALL = NUMBERS_SIMPLE + YEARS + YEARS_YY
 SYMBOLS_COMMON = ['!', '@', '#', '$', '%', '*', '?'] # Reduced set for patterns/insertions
 SYMBOLS_ALL = ['!', '@', '#', '$', '%', '^', '&', '*', '?', '.', '-', '_', '+', '=']
+INSERT_CHARS = tuple(SYMBOLS_COMMON + NUMBERS_SIMPLE) # Characters inserted at the start/end
 # Leet Speak mappings
+LEET_LEVELS = ('none', 'simple', 'full')
 LEET_MAP_SIMPLE = {'a': '@', 'e': '3', 'i': '1', 'o': '0', 's': '$'}
 LEET_MAP_FULL = {'a': ['@', '4'], 'b': ['8'], 'e': ['3'], 'g': ['6', '9'], 'i': ['1', '!', '|'],
                  'l': ['1', '|'], 'o': ['0'], 's': ['$', '5'], 't': ['7'], 'z': ['2']}
+DEFAULT_LEET_MAX_SUBS = 3 # Substituted positions per full-leet variant
+DEFAULT_LEET_MAX_VARIANTS = 64 # Full-leet variants per word
 DEFAULT_PREFIXES = ['admin_', 'test_', 'dev_', 'backup_', 'staging_', 'prod_', 'pw_', 'pass_']
 # Extensions removed as less relevant for passwords
+# Per-target fields accepted in --targets records (the matching command-line options are the defaults)
+TARGET_FIELDS = ('first_name', 'last_name', 'username', 'nickname', 'birth_date', 'partner_name', 'pet_name', 'company', 'keyword', 'keyword_file')
+# Options a --serve client may set per request (no file paths)
+SERVE_FIELDS = tuple(f for f in TARGET_FIELDS if f != 'keyword_file') + ('no_case', 'leet_level', 'leet_max_subs', 'leet_max_variants', 'reverse', 'no_numbers', 'no_symbols',
+    'no_dates', 'no_years', 'no_combinations', 'no_insertions', 'no_patterns', 'min_len', 'max_len', 'require_classes', 'forbid_chars', 'match_regex', 'top', 'stream', 'max_candidates', 'trim_stages')
+CHAR_CLASSES = ('lower', 'upper', 'digit', 'symbol') # Classes usable in --require-classes
+# Default likelihood weights (0-1] of applying each transformation, used by --top ranking
+STAGE_TYPES = ('case', 'leet', 'reverse', 'insertions', 'affixes', 'patterns', 'combinations') # Stages usable in --stage-graph
+DEFAULT_RANK_WEIGHTS = {'base': 1.0, 'case': 0.8, 'leet': 0.3, 'reverse': 0.1, 'insertions': 0.4, 'affixes': 0.6, 'patterns': 0.3, 'combinations': 0.5}
+# Order in which --trim-stages drops stages to fit --max-candidates ('Leet:full' downgrades full leet to simple)
+TRIM_ORDER = ('Patterns', 'Affixes', 'Insertions', 'Leet:full', 'Leet', 'Reverse', 'Combinations', 'Case')
 
 # --- Logging Setup ---
 log = logging.getLogger('PassForge')
 log.setLevel(logging.INFO)
-console_handler = logging.StreamHandler(sys.stdout)
-console_formatter = logging.Formatter('[%(levelname).1s] %(asctime)s %(message)s', datefmt='%H:%M:%S')
-console_handler.setFormatter(console_formatter)
-if not log.handlers:
-    log.addHandler(console_handler)
-file_handler = None
+log.addHandler(logging.NullHandler()) # Importing stays silent; the command line calls configure_logging()
+
+def configure_logging(level=logging.INFO, log_file=None):
+    """Attaches the console (stdout) handler and an optional log file, as the command line does."""
+    log.setLevel(level)
+    if not any(type(h) is logging.StreamHandler for h in log.handlers):
+        console_handler = logging.StreamHandler(sys.stdout)
+        console_handler.setFormatter(logging.Formatter('[%(levelname).1s] %(asctime)s %(message)s', datefmt='%H:%M:%S'))
+        log.addHandler(console_handler)
+    if log_file:
+        file_handler = logging.FileHandler(log_file, mode='w')
+        file_handler.setFormatter(logging.Formatter('%(asctime)s [%(levelname)s] %(message)s', datefmt='%Y-%m-%d %H:%M:%S'))
+        log.addHandler(file_handler)
+        log.info(f"Logging detailed output to: {log_file}")
+
+# --- Leet Enumeration ---
+def iter_leet_variants(word, leet_map, max_subs=None, max_variants=None):
+    """Lazily yields leet variants of word in order of increasing substitution count.
+
+    All single substitutions come first, then pairs, and so on up to max_subs
+    positions; enumeration stops after max_variants variants. None means no limit.
+    """
+    positions = [(i, leet_map[c.lower()]) for i, c in enumerate(word) if c.lower() in leet_map]
+    if not positions: return
+    max_k = len(positions) if not max_subs else min(max_subs, len(positions))
+    emitted = 0
+    for k in range(1, max_k + 1):
+        for chosen in itertools.combinations(positions, k):
+            for replacements in itertools.product(*(options for _, options in chosen)):
+                chars = list(word)
+                for (index, _), replacement in zip(chosen, replacements): chars[index] = replacement
+                yield "".join(chars); emitted += 1
+                if max_variants and emitted >= max_variants: return
+
+def count_leet_variants(word, leet_map, max_subs=None, max_variants=None):
+    """Counts what iter_leet_variants would yield, without building the variants."""
+    options = [len(leet_map[c.lower()]) for c in word if c.lower() in leet_map]
+    # by_k[k] = number of ways to substitute exactly k positions (elementary symmetric sums)
+    by_k = [1] + [0] * len(options)
+    for n in options:
+        for k in range(len(options), 0, -1): by_k[k] += by_k[k - 1] * n
+    total = sum(by_k[1:(max_subs or len(options)) + 1])
+    return min(total, max_variants) if max_variants else total
+
+
+# --- Ranking Weights ---
+def load_rank_weights(path=None):
+    """Returns the --top stage weights, overriding the defaults with a JSON file of {stage: weight}."""
+    weights = dict(DEFAULT_RANK_WEIGHTS)
+    if path:
+        try:
+            with open(path, 'r', encoding='utf-8') as f: overrides = json.load(f)
+        except (OSError, ValueError) as e: raise ValueError(f"Cannot read rank weights file {path}: {e}")
+        if not isinstance(overrides, dict): raise ValueError(f"Rank weights file {path} must contain a JSON object")
+        for stage, weight in overrides.items():
+            if stage not in weights: raise ValueError(f"Unknown stage '{stage}' in rank weights (choose from {', '.join(weights)})")
+            if isinstance(weight, bool) or not isinstance(weight, (int, float)) or not 0 < weight <= 1: raise ValueError(f"Rank weight for '{stage}' must be in (0, 1], got {weight!r}")
+            weights[stage] = float(weight)
+    return weights
+
+
+# --- Password Policy ---
+@functools.lru_cache(maxsize=65536)
+def char_classes(text):
+    """Returns the character classes (lower/upper/digit/symbol) present in text."""
+    classes = set()
+    for c in text:
+        if c.islower(): classes.add('lower')
+        elif c.isupper(): classes.add('upper')
+        elif c.isdigit(): classes.add('digit')
+        elif not c.isalnum(): classes.add('symbol')
+    return frozenset(classes)
+
+
+class PasswordPolicy:
+    """Length and composition constraints, checked by stages before they build candidates."""
+
+    def __init__(self, min_len=None, max_len=None, require=(), forbid='', regex=None):
+        self.min_len = min_len; self.max_len = max_len
+        self.require = frozenset(require); self.forbid = frozenset(forbid)
+        self.regex = re.compile(regex) if regex else None
+        self.pruned_early = 0 # Candidates skipped before being built
+        self.filtered_late = 0 # Candidates built and then rejected by the final filter
+
+    @classmethod
+    def from_args(cls, args):
+        try: return cls(args.min_len, args.max_len, args.require_classes or (), args.forbid_chars or '', args.match_regex)
+        except re.error as e: raise ValueError(f"Invalid --match-regex pattern: {e}")
+
+    @property
+    def active(self):
+        return self.min_len is not None or self.max_len is not None or bool(self.require or self.forbid or self.regex)
+
+    def allows(self, text):
+        """Checks that text contains no forbidden characters."""
+        return not self.forbid.intersection(text)
+
+    def room(self, word):
+        """Returns how many characters may still be appended to word (None if unlimited, -1 if none can be)."""
+        if not self.allows(word): return -1 # Forbidden chars are carried into every concatenation
+        return None if self.max_len is None else self.max_len - len(word)
+
+    def can_build(self, parts, require=True):
+        """Checks whether the concatenation of parts can still pass the policy (require=False skips the class check, for non-terminal stages)."""
+        if (self.max_len is not None and sum(map(len, parts)) > self.max_len) or not all(map(self.allows, parts)) \
+                or (require and self.require and not self.require <= frozenset().union(*map(char_classes, parts))):
+            self.pruned_early += 1; return False
+        return True
+
+    def accepts(self, word):
+        """Checks a finished candidate against every constraint."""
+        return (self.min_len is None or len(word) >= self.min_len) and (self.max_len is None or len(word) <= self.max_len) \
+            and self.allows(word) and self.require <= char_classes(word) and (self.regex is None or self.regex.search(word) is not None)
+
+    def describe(self):
+        return f"MinLen={self.min_len}, MaxLen={self.max_len}, Require={','.join(sorted(self.require)) or '-'}, Forbid={''.join(sorted(self.forbid)) or '-'}, Regex={self.regex.pattern if self.regex else '-'}"
+
+
+class PartTable:
+    """Concatenation parts (numbers, symbols, affixes) sorted by length so stages can prune early."""
+
+    def __init__(self, parts, forbid=frozenset()):
+        parts = list(dict.fromkeys(str(p) for p in parts))
+        self.total = len(parts) # Including parts dropped for forbidden chars
+        self.parts = sorted((p for p in parts if not forbid.intersection(p)), key=len)
+        self.lengths = [len(p) for p in self.parts]
+        self._cache = {}
+
+    def select(self, room, need=frozenset()):
+        """Returns the parts no longer than room that supply every class in need."""
+        key = (room, need)
+        if key not in self._cache:
+            parts = self.parts if room is None else self.parts[:bisect.bisect_right(self.lengths, room)]
+            self._cache[key] = [p for p in parts if need <= char_classes(p)] if need else parts
+        return self._cache[key]
+
+
+@functools.lru_cache(maxsize=256)
+def part_table(parts, forbid=frozenset()):
+    """Returns a shared PartTable for a tuple of parts, so runs with the same tables reuse them and their select() cache."""
+    return PartTable(parts, forbid)
+
+
+# --- External Deduplication ---
+class SpillingSet:
+    """Deduplicating collector that spills sorted runs to disk once it passes a memory budget.
+
+    Iterating yields every unique word in sorted order, using a k-way merge of
+    the spilled runs and whatever is still held in memory.
+    """
+
+    def __init__(self, mem_limit, tmpdir=None):
+        self.mem_limit = mem_limit
+        self.tmpdir = tempfile.mkdtemp(prefix='passforge-spill-', dir=tmpdir)
+        self.runs = []; self.spilled_bytes = 0
+        self._words = set(); self._bytes = 0; self._files_written = 0
+
+    def __enter__(self): return self
+
+    def __exit__(self, *exc): self.close()
+
+    def add(self, word):
+        if word in self._words: return
+        self._words.add(word); self._bytes += sys.getsizeof(word) + SET_ENTRY_OVERHEAD
+        if self._bytes > self.mem_limit: self._spill()
+
+    def update(self, words):
+        for word in words: self.add(word)
+
+    def _write_run(self, words):
+        path = os.path.join(self.tmpdir, f"run{self._files_written}-{os.getpid()}.txt"); self._files_written += 1
+        with open(path, 'w', encoding='utf-8', buffering=OUTPUT_BUFFER_SIZE) as f:
+            for word in words: f.write(word + "\n")
+        self.spilled_bytes += os.path.getsize(path)
+        return path
+
+    def _spill(self):
+        """Writes the in-memory words as a sorted run and clears the set."""
+        self.runs.append(self._write_run(sorted(self._words)))
+        log.info(f"Memory budget reached: spilled run #{len(self.runs)} ({len(self._words)} words, {self.spilled_bytes} bytes written so far)")
+        self._words = set(); self._bytes = 0
+
+    def _merge(self, paths):
+        """Lazily k-way merges sorted run files, dropping duplicates."""
+        files = [open(path, 'r', encoding='utf-8') for path in paths]
+        try:
+            last = None
+            for word in heapq.merge(*((line[:-1] for line in f) for f in files)):
+                if word != last: yield word; last = word
+        finally:
+            for f in files: f.close()
+
+    def __iter__(self):
+        if not self.runs: yield from sorted(self._words); return
+        if self._words: self._spill()
+        runs = self.runs
+        while len(runs) > MAX_MERGE_FANIN: # Merge in passes to stay under open-file limits
+            merged = []
+            for i in range(0, len(runs), MAX_MERGE_FANIN):
+                group = runs[i:i + MAX_MERGE_FANIN]; merged.append(self._write_run(self._merge(group)))
+                for path in group: os.remove(path)
+            runs = self.runs = merged
+        log.info(f"Merging {len(runs)} spilled runs ({self.spilled_bytes} bytes written)")
+        yield from self._merge(runs)
+
+    def close(self):
+        shutil.rmtree(self.tmpdir, ignore_errors=True)
+
+
+# --- Fingerprint Index ---
+def fingerprint(word):
+    """Returns the 64-bit blake2b fingerprint of a candidate."""
+    return int.from_bytes(hashlib.blake2b(word.encode('utf-8'), digest_size=8).digest(), 'little')
+
+
+class BloomFilter:
+    """Bloom filter over 64-bit fingerprints; the probe positions are derived by double hashing."""
+
+    def __init__(self, size_bits, num_hashes, bits=None):
+        self.size_bits = size_bits; self.num_hashes = num_hashes
+        self.bits = bits if bits is not None else bytearray((size_bits + 7) // 8)
+
+    @classmethod
+    def for_capacity(cls, capacity, error_rate=BLOOM_ERROR_RATE):
+        capacity = max(capacity, 1024)
+        size_bits = int(-capacity * math.log(error_rate) / math.log(2) ** 2) + 1
+        return cls(size_bits, max(1, round(size_bits / capacity * math.log(2))))
+
+    @property
+    def capacity(self):
+        return int(self.size_bits * math.log(2) ** 2 / -math.log(BLOOM_ERROR_RATE))
+
+    def _positions(self, fp):
+        h1 = fp & 0xFFFFFFFF; h2 = (fp >> 32) | 1
+        return [(h1 + i * h2) % self.size_bits for i in range(self.num_hashes)]
+
+    def add(self, fp):
+        bits = self.bits
+        for pos in self._positions(fp): bits[pos >> 3] |= 1 << (pos & 7)
+
+    def __contains__(self, fp):
+        bits = self.bits
+        for pos in self._positions(fp):
+            if not bits[pos >> 3] & (1 << (pos & 7)): return False
+        return True
+
+    def save(self, path):
+        with open(path + '.tmp', 'wb') as f: f.write(struct.pack('<QI', self.size_bits, self.num_hashes)); f.write(self.bits)
+        os.replace(path + '.tmp', path)
+
+    @classmethod
+    def load(cls, path, writable=True):
+        """Loads a saved filter; read-only filters are memory-mapped instead of read into RAM."""
+        with open(path, 'rb') as f:
+            size_bits, num_hashes = struct.unpack('<QI', f.read(12))
+            if writable: return cls(size_bits, num_hashes, bytearray(f.read()))
+            mapped = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        return cls(size_bits, num_hashes, memoryview(mapped)[12:])
+
+
+class FingerprintIndex:
+    """Sorted 64-bit fingerprints (native byte order) in a file, memory-mapped and searched by bisection."""
+
+    def __init__(self, path, offset=0):
+        self.path = path; self._file = self._mmap = None; self._values = ()
+        if os.path.exists(path) and os.path.getsize(path) >= offset + 8:
+            self._file = open(path, 'rb')
+            self._mmap = mmap.mmap(self._file.fileno(), 0, access=mmap.ACCESS_READ)
+            self._values = memoryview(self._mmap)[offset:].cast('Q')
+
+    def __len__(self): return len(self._values)
+
+    def __iter__(self): return iter(self._values)
+
+    def __contains__(self, fp):
+        i = bisect.bisect_left(self._values, fp)
+        return i < len(self._values) and self._values[i] == fp
+
+    def close(self):
+        if self._mmap is not None: self._values.release(); self._mmap.close(); self._file.close()
+        self._file = self._mmap = None; self._values = ()
+
+    @staticmethod
+    def write(path, fingerprints, header=b''):
+        """Writes sorted fingerprints to path after header, dropping duplicates. Returns the number written."""
+        count = 0; last = None; buffer = array('Q')
+        with open(path + '.tmp', 'wb') as f:
+            f.write(header)
+            for fp in fingerprints:
+                if fp == last: continue
+                buffer.append(fp); last = fp; count += 1
+                if len(buffer) >= 1 << 16: buffer.tofile(f); buffer = array('Q')
+            buffer.tofile(f)
+        os.replace(path + '.tmp', path)
+        return count
+
+
+class IncrementalState:
+    """Index of every candidate emitted for one profile, persisted in a --state directory.
+
+    manifest.json records the options, birth date parts and base words of the
+    last run; fingerprints.bin is the sorted fingerprint index and bloom.bin a
+    Bloom filter in front of it, so most new candidates never touch the index.
+    """
+
+    def __init__(self, directory):
+        os.makedirs(directory, exist_ok=True)
+        self.manifest_path = os.path.join(directory, 'manifest.json')
+        self.index_path = os.path.join(directory, 'fingerprints.bin')
+        self.bloom_path = os.path.join(directory, 'bloom.bin')
+        self.manifest = {}
+        if os.path.exists(self.manifest_path):
+            with open(self.manifest_path, 'r', encoding='utf-8') as f: self.manifest = json.load(f)
+        self.index = FingerprintIndex(self.index_path)
+        self.bloom = BloomFilter.load(self.bloom_path) if len(self.index) and os.path.exists(self.bloom_path) else None
+
+    def seen(self, fp):
+        return self.bloom is not None and fp in self.bloom and fp in self.index
+
+    def commit(self, new_fingerprints, manifest):
+        """Merges new fingerprints into the index, updates the Bloom filter and saves the manifest."""
+        new_fingerprints = sorted(new_fingerprints)
+        total = FingerprintIndex.write(self.index_path + '.new', heapq.merge(self.index, new_fingerprints))
+        self.index.close(); os.replace(self.index_path + '.new', self.index_path)
+        if self.bloom is None or total > self.bloom.capacity: # Rebuild with room to grow
+            self.bloom = BloomFilter.for_capacity(total * 2); self.index = FingerprintIndex(self.index_path)
+            for fp in self.index: self.bloom.add(fp)
+        else:
+            for fp in new_fingerprints: self.bloom.add(fp)
+        self.bloom.save(self.bloom_path)
+        with open(self.manifest_path + '.tmp', 'w', encoding='utf-8') as f: json.dump(dict(manifest, count=total), f)
+        os.replace(self.manifest_path + '.tmp', self.manifest_path)
+        log.info(f"State saved: {total} candidates indexed.")
+
+    def close(self):
+        self.index.close()
+
+
+class ExclusionIndex(FingerprintIndex):
+    """Fingerprints of every line of a reference wordlist (--exclude-wordlist), memory-mapped from disk.
+
+    The index file starts with a header recording the wordlist's size and
+    modification time, so a stale index is detected and rebuilt. Lookups are
+    done in sorted batches, which keeps consecutive bisections on nearby pages.
+    """
+    HEADER = struct.Struct('<8sQQ') # Magic, wordlist size, wordlist mtime_ns
+    MAGIC = b'PFXIDX01'
+
+    def __init__(self, path):
+        super().__init__(path, self.HEADER.size)
+        self.excluded = 0
+
+    def __reduce__(self): # Worker processes reopen the mapping instead of pickling it
+        return self.__class__, (self.path,)
+
+    @classmethod
+    def open(cls, wordlist, index_path=None, mem_limit=None):
+        """Opens the index of wordlist, building it first if it is missing or older than the wordlist."""
+        index_path = index_path or wordlist + '.pfx'
+        stat = os.stat(wordlist); header = cls.HEADER.pack(cls.MAGIC, stat.st_size, stat.st_mtime_ns)
+        try:
+            with open(index_path, 'rb') as f: current = f.read(cls.HEADER.size) == header
+        except OSError: current = False
+        if current: log.info(f"Using exclusion index {index_path}")
+        else: cls.build(wordlist, index_path, header, max(1 << 16, mem_limit // 48) if mem_limit else EXCLUDE_RUN_SIZE)
+        return cls(index_path)
+
+    @classmethod
+    def build(cls, wordlist, index_path, header, run_size=EXCLUDE_RUN_SIZE):
+        """Fingerprints every line of wordlist into sorted runs of run_size and merges them into the index."""
+        log.info(f"Building exclusion index {index_path} from {wordlist}...")
+        start = time.perf_counter(); lines = 0
+        with tempfile.TemporaryDirectory(prefix='passforge-index-') as tmpdir:
+            runs = []; chunk = []
+            def write_run():
+                runs.append(os.path.join(tmpdir, f"run{len(runs)}.bin"))
+                with open(runs[-1], 'wb') as f: array('Q', sorted(chunk)).tofile(f)
+                chunk.clear()
+            with open(wordlist, 'rb') as f: # Bytes: lines hash exactly as the UTF-8 candidates they would match
+                for line in f:
+                    line = line.rstrip(b'\r\n')
+                    if not line: continue
+                    chunk.append(int.from_bytes(hashlib.blake2b(line, digest_size=8).digest(), 'little')); lines += 1
+                    if len(chunk) >= run_size: write_run()
+            if chunk: write_run()
+            count = FingerprintIndex.write(index_path, heapq.merge(*(_iter_fingerprint_file(path) for path in runs)), header)
+        log.info(f"Exclusion index built: {count} unique of {lines} lines in {len(runs)} runs, {time.perf_counter() - start:.2f}s.")
+
+    def novel(self, words):
+        """Lazily yields the words that are not in the index, counting the rest in self.excluded."""
+        values = self._values; size = len(values)
+        if not size: yield from words; return
+        words = iter(words)
+        while True:
+            batch = list(itertools.islice(words, EXCLUDE_BATCH_SIZE))
+            if not batch: return
+            fingerprints = [fingerprint(word) for word in batch]
+            found = set(); lo = 0
+            for fp in sorted(fingerprints):
+                lo = bisect.bisect_left(values, fp, lo)
+                if lo == size: break
+                if values[lo] == fp: found.add(fp)
+            if found:
+                self.excluded += sum(fp in found for fp in fingerprints)
+                yield from (word for word, fp in zip(batch, fingerprints) if fp not in found)
+            else: yield from batch
+
+
+def _iter_fingerprint_file(path):
+    """Yields the fingerprints stored in a raw uint64 file, reading it in blocks."""
+    with open(path, 'rb') as f:
+        while True:
+            block = array('Q'); block.frombytes(f.read(1 << 20))
+            if not block: return
+            yield from block
+
+
+# --- Stage Profiling ---
+class StageProfiler:
+    """Records wall time, tracemalloc peak and set growth for each pipeline stage (--profile)."""
+
+    def __init__(self):
+        self.stages = []; self._started = time.perf_counter()
+        self._owns_tracing = not tracemalloc.is_tracing() # Leave tracing alone if the caller already runs it
+        if self._owns_tracing: tracemalloc.start()
+
+    def run(self, name, func, words, processed=None):
+        """Runs func(words); merges the result into processed (if given) and records the stage. Returns the result."""
+        count_in = len(words); before = len(processed) if processed is not None else None
+        tracemalloc.reset_peak() if hasattr(tracemalloc, 'reset_peak') else tracemalloc.clear_traces()
+        start = time.perf_counter()
+        result = func(words)
+        if processed is not None: processed.update(result)
+        elapsed = time.perf_counter() - start; peak = tracemalloc.get_traced_memory()[1]
+        count_out = len(result); new = len(processed) - before if processed is not None else None
+        self.stages.append({'stage': name, 'wall_time_s': round(elapsed, 6), 'peak_memory_bytes': peak,
+                            'candidates_in': count_in, 'candidates_out': count_out, 'new_candidates': new,
+                            'dedupe_hit_ratio': round((count_out - new) / count_out, 6) if new is not None and count_out else None})
+        log.debug(f"Profile {name}: {elapsed:.3f}s, peak {peak} bytes, in={count_in}, out={count_out}, new={new}")
+        return result
+
+    def report(self, **extra):
+        return {'version': __version__, **extra, 'total_wall_time_s': round(time.perf_counter() - self._started, 6), 'stages': self.stages}
+
+    def write(self, path, **extra):
+        if self._owns_tracing: tracemalloc.stop()
+        try:
+            with open(path, 'w', encoding='utf-8') as f: json.dump(self.report(**extra), f, indent=2); f.write("\n")
+            log.info(f"Stage profile written to {path}")
+        except IOError as e: log.error(f"Failed to write profile to {path}: {e}")
+
+
+# --- Stage Graph ---
+class FactoredSet:
+    """Lazy union of concatenation products.
+
+    Each term is a tuple of factors (sequences of strings); every choice of one
+    element per factor, joined in order, is a member. Members are built only
+    when iterated, and len() counts products without expanding them (duplicates
+    across terms included).
+    """
+
+    def __init__(self):
+        self.terms = []
+
+    def add(self, *factors):
+        if all(factors): self.terms.append(factors)
+
+    def __len__(self):
+        return sum(functools.reduce(lambda n, factor: n * len(factor), factors, 1) for factors in self.terms)
+
+    def __iter__(self):
+        for factors in self.terms:
+            if len(factors) == 2:
+                first, second = factors
+                for a in first:
+                    for b in second: yield a + b
+            elif len(factors) == 3:
+                first, second, third = factors
+                for a in first:
+                    for b in second:
+                        for c in third: yield a + b + c
+            else:
+                for parts in itertools.product(*factors): yield "".join(parts)
+
+
+class StageGraph:
+    """A --stage-graph: named stage nodes, each applied to the union of its input nodes' outputs.
+
+    'base' is the set of base words. A node outputs only the variants its stage
+    builds (list its inputs as outputs too to keep the originals), and the
+    combinations stage always works on the base words. The wordlist is the
+    union of the output nodes.
+    """
+
+    def __init__(self, nodes, outputs):
+        self.nodes = nodes # [(name, stage, inputs)] in dependency order
+        self.outputs = outputs
+        self.consumed = {i for _, _, inputs in nodes for i in inputs}
+
+    @classmethod
+    def load(cls, path):
+        try:
+            with open(path, 'r', encoding='utf-8') as f: data = json.load(f)
+        except (OSError, ValueError) as e: raise ValueError(f"Cannot read stage graph file {path}: {e}")
+        try: return cls.from_dict(data)
+        except ValueError as e: raise ValueError(f"Stage graph {path}: {e}")
+
+    @classmethod
+    def from_dict(cls, data):
+        """Builds a graph from {"stages": {name: {"stage": type, "inputs": [...]}}, "output": [...]}, validating it."""
+        if not isinstance(data, dict) or not isinstance(data.get('stages'), dict): raise ValueError("expected a JSON object with a \"stages\" object")
+        specs = {}
+        for name, spec in data['stages'].items():
+            if name == 'base': raise ValueError("'base' is reserved for the base words")
+            if not isinstance(spec, dict): raise ValueError(f"stage '{name}' must be a JSON object")
+            stage = spec.get('stage', name); inputs = spec.get('inputs', [])
+            if stage not in STAGE_TYPES: raise ValueError(f"unknown stage type '{stage}' for '{name}' (choose from {', '.join(STAGE_TYPES)})")
+            if not isinstance(inputs, list) or not all(isinstance(i, str) for i in inputs): raise ValueError(f"inputs of '{name}' must be a list of stage names")
+            if stage == 'combinations':
+                if set(inputs) - {'base'}: raise ValueError(f"'{name}' combines the base words and takes no other inputs")
+                inputs = []
+            elif not inputs: raise ValueError(f"stage '{name}' has no inputs")
+            unknown = [i for i in inputs if i != 'base' and i not in data['stages']]
+            if unknown: raise ValueError(f"stage '{name}' reads unknown stage(s): {', '.join(unknown)}")
+            specs[name] = (stage, list(dict.fromkeys(inputs)))
+        outputs = data.get('output', ['base'] + list(specs))
+        if not isinstance(outputs, list) or not outputs: raise ValueError("\"output\" must be a non-empty list of stage names")
+        unknown = [o for o in outputs if o != 'base' and o not in specs]
+        if unknown: raise ValueError(f"unknown output stage(s): {', '.join(unknown)}")
+        nodes = []; done = {'base'}; visiting = set()
+        def visit(name): # Depth-first topological sort
+            if name in done: return
+            if name in visiting: raise ValueError(f"cycle through stage '{name}'")
+            visiting.add(name)
+            for i in specs[name][1]: visit(i)
+            visiting.discard(name); done.add(name); nodes.append((name, *specs[name]))
+        for name in specs: visit(name)
+        return cls(nodes, list(dict.fromkeys(outputs)))
+
+    def terminal_stages(self):
+        """Returns the stage types (pipeline names) whose output only goes to the wordlist, so they may prune on missing classes."""
+        consumed_types = {stage for name, stage, _ in self.nodes if name in self.consumed}
+        return {stage.capitalize() for _, stage, _ in self.nodes if stage not in consumed_types}
+
+    def describe(self):
+        return "; ".join(f"{name}({stage})<-{'+'.join(inputs) or 'base'}" for name, stage, inputs in self.nodes) + f"; output={'+'.join(self.outputs)}"
+
+
+# --- Library API ---
+@dataclasses.dataclass
+class GeneratorConfig:
+    """Typed PasswordGenerator options; field names and defaults match the command-line options."""
+    # Target information
+    first_name: Optional[str] = None
+    last_name: Optional[str] = None
+    username: Optional[str] = None
+    nickname: Optional[str] = None
+    birth_date: Optional[str] = None
+    partner_name: Optional[str] = None
+    pet_name: Optional[str] = None
+    company: Optional[str] = None
+    keyword: Optional[List[str]] = None
+    keyword_file: Optional[str] = None
+    # Transformations
+    no_case: bool = False
+    leet_level: str = 'none'
+    leet_max_subs: int = DEFAULT_LEET_MAX_SUBS
+    leet_max_variants: int = DEFAULT_LEET_MAX_VARIANTS
+    reverse: bool = False
+    no_numbers: bool = False
+    no_symbols: bool = False
+    no_dates: bool = False
+    no_years: bool = False
+    no_combinations: bool = False
+    no_insertions: bool = False
+    no_patterns: bool = False
+    # Output and filters
+    output_file: Optional[str] = None
+    min_len: Optional[int] = DEFAULT_MIN_LEN
+    max_len: Optional[int] = DEFAULT_MAX_LEN
+    require_classes: Optional[List[str]] = None
+    forbid_chars: Optional[str] = None
+    match_regex: Optional[str] = None
+    top: Optional[int] = None
+    rank_weights: Optional[str] = None
+    stream: bool = False
+    pipe: Optional[str] = None
+    stage_graph: Optional[str] = None
+    exclude_wordlist: Optional[str] = None
+    exclude_index: Optional[str] = None
+    state: Optional[str] = None
+    # Performance
+    profile: Optional[str] = None
+    max_candidates: Optional[int] = None
+    trim_stages: bool = False
+    mem_limit: Optional[int] = None
+    workers: int = 1
+    loglevel: int = logging.INFO
+
+    @classmethod
+    def from_args(cls, args):
+        """Builds a config from an argparse.Namespace (extra attributes are ignored)."""
+        return cls(**{f.name: getattr(args, f.name) for f in dataclasses.fields(cls) if hasattr(args, f.name)})
+
+    @classmethod
+    def from_dict(cls, data, allowed=None, base=None):
+        """Builds a config from a plain dict (e.g. decoded JSON) on top of base, validating names and value types."""
+        if not isinstance(data, dict): raise ValueError("expected a JSON object of options")
+        types = {f.name: f.type for f in dataclasses.fields(cls)}
+        values = {}
+        for key, value in data.items():
+            name = str(key).replace('-', '_')
+            if name not in types or (allowed is not None and name not in allowed): raise ValueError(f"unknown or disallowed option '{key}'")
+            values[name] = _coerce_field(name, types[name], value)
+        return dataclasses.replace(base or cls(), **values).validate()
+
+    def validate(self):
+        """Applies the command line's range checks. Returns self; raises ValueError on a bad value."""
+        if self.top is not None and self.top < 1: raise ValueError("top must be at least 1")
+        if self.max_candidates is not None and self.max_candidates < 1: raise ValueError("max_candidates must be at least 1")
+        if self.leet_max_subs < 0 or self.leet_max_variants < 0: raise ValueError("leet_max_subs and leet_max_variants must be 0 (no limit) or more")
+        if any(length is not None and length < 0 for length in (self.min_len, self.max_len)): raise ValueError("min_len and max_len must not be negative")
+        if self.min_len is not None and self.max_len is not None and self.min_len > self.max_len: raise ValueError(f"min_len ({self.min_len}) is greater than max_len ({self.max_len})")
+        return self
+
+    def normalized(self):
+        """Returns a validated copy with surrounding whitespace stripped from the target fields."""
+        values = {name: getattr(self, name).strip() for name in TARGET_FIELDS if isinstance(getattr(self, name), str)}
+        if self.keyword: values['keyword'] = [k.strip() for k in self.keyword if k.strip()]
+        return dataclasses.replace(self, **values).validate()
+
+    def cache_key(self):
+        """Returns a key of everything that affects the generated candidates (use on a normalized() config)."""
+        data = dataclasses.asdict(self)
+        for name in ('output_file', 'pipe', 'profile', 'loglevel', 'workers', 'mem_limit', 'exclude_index'): del data[name] # Same output either way
+        for name in ('keyword', 'require_classes'): # Order-insensitive
+            if data[name]: data[name] = sorted(set(data[name]))
+        for name in ('keyword_file', 'rank_weights', 'exclude_wordlist', 'stage_graph'): # File contents matter, not just the path
+            if data[name] and os.path.exists(data[name]):
+                stat = os.stat(data[name]); data[name] = [os.path.abspath(data[name]), stat.st_mtime_ns, stat.st_size]
+        return json.dumps(data, sort_keys=True)
+
+
+def _coerce_field(name, field_type, value):
+    """Checks a GeneratorConfig value against its annotated type."""
+    options = getattr(field_type, '__args__', None) if getattr(field_type, '__origin__', None) is not list else None
+    if value is None:
+        if options and type(None) in options: return None
+        raise ValueError(f"'{name}' cannot be null")
+    expected = next(t for t in options if t is not type(None)) if options else field_type
+    if getattr(expected, '__origin__', None) is list:
+        if isinstance(value, str): value = [v for v in value.split(',') if v.strip()]
+        if not isinstance(value, list) or not all(isinstance(v, str) for v in value): raise ValueError(f"'{name}' must be a list of strings")
+    elif expected is int and (isinstance(value, bool) or not isinstance(value, int)): raise ValueError(f"'{name}' must be an integer")
+    elif expected in (bool, str) and not isinstance(value, expected): raise ValueError(f"'{name}' must be a {expected.__name__}")
+    if name == 'leet_level' and value not in LEET_LEVELS: raise ValueError(f"'leet_level' must be one of {', '.join(LEET_LEVELS)}")
+    if name == 'require_classes':
+        try: value = parse_char_classes(",".join(value))
+        except argparse.ArgumentTypeError as e: raise ValueError(str(e))
+    return value
+
+
+def iter_passwords(config=None, **options):
+    """Yields candidates for one profile without argparse, e.g. iter_passwords(first_name='John', birth_date='1990-05-15').
+
+    Keyword options override fields of config (a GeneratorConfig). The output follows
+    the config: the sorted unique list by default, or streamed/ranked with stream/top.
+    """
+    config = dataclasses.replace(config or GeneratorConfig(), **options).validate()
+    generator = PasswordGenerator(config)
+    try:
+        yield from generator.candidates() or ()
+        generator.commit_state() # The caller has received every candidate
+    finally: generator.close()
+
 
 # --- Password Generator Class ---
 class PasswordGenerator:
-    """Generates personalized password wordlists."""
+    """Generates personalized password wordlists.
+
+    args is an argparse.Namespace from build_parser() or a GeneratorConfig.
+    """
 
     def __init__(self, args):
         self.args = args
         self.base_words = set()
         self.date_parts = {}
-        self.lock = threading.Lock()
+        self.trimmed_stages = set() # Stages dropped by --trim-stages
+        self._state_update = None # (fingerprints, manifest) of a finished --state run, see commit_state()
+        self.write_error = None # Set by run_and_output() when the output could not be written
 
         log.info(f"PassForge v{__version__} initialized.")
         log.info(f"Transformations: Case={not args.no_case}, Leet={args.leet_level}, Reverse={args.reverse}, Numbers={not args.no_numbers}, Symbols={not args.no_symbols}, Dates={not args.no_dates}, Combinations={not args.no_combinations}, Insertions={not args.no_insertions}, Patterns={not args.no_patterns}")
-        log.info(f"Filters: MinLen={args.min_len}, MaxLen={args.max_len}")
+        self.policy = PasswordPolicy.from_args(args)
+        log.info(f"Filters: {self.policy.describe()}")
+        self.exclusion = self._load_exclusion()
+        self.stage_graph = StageGraph.load(args.stage_graph) if getattr(args, 'stage_graph', None) else None
 
         self._load_base_words()
         if args.birth_date:
             self._parse_birth_date(args.birth_date)
+        self._build_tables()
 
     def _load_base_words(self):
         """Loads initial keywords from args and keyword file."""
@@ -80,6 +812,14 @@ class PasswordGenerator:
         else: log.info(f"Total unique base keywords: {len(self.base_words)}")
 
 
+    def _load_exclusion(self):
+        """Opens (building if needed) the --exclude-wordlist index, or returns None."""
+        wordlist = getattr(self.args, 'exclude_wordlist', None)
+        if not wordlist: return None
+        if not os.path.exists(wordlist): log.error(f"Exclusion wordlist not found: {wordlist}"); return None
+        try: return ExclusionIndex.open(wordlist, self.args.exclude_index, self.args.mem_limit)
+        except OSError as e: log.error(f"Error indexing exclusion wordlist {wordlist}: {e}"); return None
+
     def _parse_birth_date(self, date_str):
         """Parses birthdate and extracts components including more formats."""
         # (Same as v2.0)
@@ -96,218 +836,1191 @@ class PasswordGenerator:
         except ValueError as e: log.error(f"Invalid birth date format '{date_str}': {e}."); self.date_parts = {}
 
 
+    def _build_tables(self):
+        """Builds the insertion/affix/pattern element tables once per run."""
+        forbid = self.policy.forbid
+        self.insert_chars = part_table(INSERT_CHARS, forbid) # Characters to insert
+        affixes = set(NUMBERS_SIMPLE) | set(SYMBOLS_ALL) # Use all symbols here
+        if not self.args.no_dates and self.date_parts: affixes.update(self.date_parts.values())
+        if not self.args.no_years: affixes.update(YEARS); affixes.update(YEARS_YY)
+        self.affixes = part_table(tuple(sorted(affixes)), forbid)
+        self.prefixes = part_table(tuple(DEFAULT_PREFIXES), forbid)
+        self.pattern_nums = part_table(tuple(NUMBERS_SIMPLE + (list(self.date_parts.values()) if not self.args.no_dates else []) + (YEARS if not self.args.no_years else []) + (YEARS_YY if not self.args.no_years else [])), forbid)
+        self.pattern_symbols = part_table(tuple(SYMBOLS_COMMON), forbid) # Use a smaller set for patterns to avoid excessive size
+        date_elements = list(self.date_parts.values()) if not self.args.no_dates else []
+        year_elements = list(YEARS) if not self.args.no_years else []
+        self.combo_affixes = sorted(str(a) for a in set(date_elements) | set(year_elements))
+        # Only stages that emit finished candidates (the last enabled one, or graph stages feeding no other stage) may prune on missing classes
+        enabled = [name for name, _, _, disabled_flag in self._pipeline() if not disabled_flag]
+        if self.stage_graph: self._terminal_stages = self.stage_graph.terminal_stages()
+        else: self._terminal_stages = {enabled[-1]} if enabled else set()
+
+    def _budget(self, word, stage):
+        """Returns (room, need) for concatenations onto word: remaining length and classes still required."""
+        need = self.policy.require - char_classes(word) if stage in self._terminal_stages else frozenset()
+        return self.policy.room(word), need
+
+    def _iter_case(self, word):
+        """Yields case variations of a single word."""
+        yield word; yield word.lower(); yield word.upper(); yield word.capitalize()
+        try: yield word.swapcase()
+        except: pass
+
     def _apply_case(self, words):
         """Applies case variations."""
-        # (Same as v2.0)
         if not words: return set()
         log.debug("Applying case transformations...")
-        variations = set()
-        for word in words:
-            variations.add(word); variations.add(word.lower()); variations.add(word.upper()); variations.add(word.capitalize())
-            try: variations.add(word.swapcase())
-            except: pass
+        variations = {v for word in words for v in self._iter_case(word)}
         log.debug(f"Case variations generated: {len(variations)}")
         return variations
 
-    def _apply_leet(self, words):
-        """Applies simple or full leet speak substitutions based on level."""
-        # (Same as v2.0)
-        if not words or self.args.leet_level == 'none': return words
-        if self.args.leet_level == 'simple': leet_map = LEET_MAP_SIMPLE; log.debug("Applying simple leet transformations...")
-        elif self.args.leet_level == 'full': leet_map = LEET_MAP_FULL; log.debug("Applying full leet transformations...")
-        else: return words
-        variations = set(words); words_to_process = list(words)
+    def _iter_leet(self, word):
+        """Yields simple or full leet speak variations of a single word."""
         if self.args.leet_level == 'full':
-            for word in words_to_process:
-                leet_chars_in_word = [(i, c.lower()) for i, c in enumerate(word) if c.lower() in leet_map]
-                if not leet_chars_in_word: continue
-                char_indices = [item[0] for item in leet_chars_in_word]; char_keys = [item[1] for item in leet_chars_in_word]
-                replacement_options = [leet_map[key] for key in char_keys]
-                for replacements_tuple in product(*replacement_options):
-                    new_word_list = list(word)
-                    for i, index in enumerate(char_indices): new_word_list[index] = replacements_tuple[i]
-                    variations.add("".join(new_word_list)); variations.add("".join(new_word_list).capitalize())
+            # Bounded and lazy: fewest substitutions first, capped per word
+            for new_word in iter_leet_variants(word, LEET_MAP_FULL, self.args.leet_max_subs, self.args.leet_max_variants):
+                yield new_word; yield new_word.capitalize()
         elif self.args.leet_level == 'simple':
-            for word in words_to_process:
-                leet_word = word.lower()
-                for char, leet in leet_map.items(): leet_word = leet_word.replace(char, leet)
-                if leet_word != word.lower(): variations.add(leet_word); variations.add(leet_word.capitalize())
+            leet_word = word.lower()
+            for char, leet in LEET_MAP_SIMPLE.items(): leet_word = leet_word.replace(char, leet)
+            if leet_word != word.lower(): yield leet_word; yield leet_word.capitalize()
+
+    def _apply_leet(self, words):
+        """Applies simple or full leet speak substitutions based on level."""
+        if not words or self.args.leet_level not in ('simple', 'full'): return words
+        log.debug(f"Applying {self.args.leet_level} leet transformations...")
+        variations = set(words)
+        for word in words: variations.update(self._iter_leet(word))
         log.debug(f"Leet variations generated: {len(variations)}")
         return variations
 
+    def _iter_reverse(self, word):
+        """Yields the reversed versions of a single word."""
+        if len(word) > 1: reversed_word = word[::-1]; yield reversed_word; yield reversed_word.capitalize()
+
     def _apply_reverse(self, words):
         """Adds reversed versions of words."""
-        # (Same as v2.0)
         if not words: return set()
         log.debug("Applying reverse transformation...")
         variations = set(words)
-        for word in words:
-             if len(word) > 1: reversed_word = word[::-1]; variations.add(reversed_word); variations.add(reversed_word.capitalize())
+        for word in words: variations.update(self._iter_reverse(word))
         log.debug(f"Reverse variations generated: {len(variations)}")
         return variations
 
+    def _iter_insertions(self, word):
+        """Yields a single word with common symbols/numbers inserted at the beginning/end."""
+        room, need = self._budget(word, 'Insertions')
+        chars = self.insert_chars.select(room, need)
+        self.policy.pruned_early += 2 * (self.insert_chars.total - len(chars))
+        for char in chars:
+            yield char + word # Prepend
+            yield word + char # Append
+
     def _apply_insertions(self, words):
         """Inserts common symbols/numbers at the beginning/end."""
         if not words: return set()
         log.debug("Applying character insertions...")
         variations = set(words)
-        insert_chars = SYMBOLS_COMMON + NUMBERS_SIMPLE # Characters to insert
-
-        # Use a copy to iterate over while modifying variations
-        words_to_modify = list(words)
-        for word in words_to_modify:
-             for char in insert_chars:
-                  variations.add(char + word) # Prepend
-                  variations.add(word + char) # Append
+        for word in words: variations.update(self._iter_insertions(word))
         log.debug(f"Insertion variations generated: {len(variations)}")
         return variations
 
+    def _budget_groups(self, words, stage):
+        """Groups words by their (room, need) budget. Returns ((room, need), words) pairs."""
+        groups = collections.defaultdict(list)
+        for word in words: groups[self._budget(word, stage)].append(word)
+        return groups.items()
+
+    def _add_affix_terms(self, product, group, room, need):
+        """Adds the prefix/suffix products of words that share one (room, need) budget to a FactoredSet."""
+        affixes = self.affixes.select(room, need); prefixes = self.prefixes.select(room, need)
+        self.policy.pruned_early += len(group) * (2 * (self.affixes.total - len(affixes)) + self.prefixes.total - len(prefixes))
+        product.add(group, affixes); product.add(affixes, group); product.add(prefixes, group)
+
+    def _factor_affixes(self, words):
+        """Returns the affix variants of words as a lazy FactoredSet."""
+        product = FactoredSet()
+        for (room, need), group in self._budget_groups(words, 'Affixes'): self._add_affix_terms(product, group, room, need)
+        return product
+
+    def _iter_affixes(self, word):
+        """Yields a single word with number/symbol/year/date prefixes and suffixes."""
+        product = FactoredSet(); self._add_affix_terms(product, (word,), *self._budget(word, 'Affixes'))
+        yield from product
+
     def _apply_affixes(self, words):
         """Adds prefixes, suffixes (numbers, years, symbols, dates)."""
-        # (Same as v2.0, uses SYMBOLS_ALL)
         if not words: return set()
         log.debug("Applying affix transformations...")
         variations = set(words)
-        affixes = set(NUMBERS_SIMPLE) | set(SYMBOLS_ALL) # Use all symbols here
-        if not self.args.no_dates and self.date_parts: affixes.update(self.date_parts.values())
-        if not self.args.no_years: affixes.update(YEARS); affixes.update(YEARS_YY)
-        words_to_affix = list(words)
-        for word in words_to_affix: # Suffixes
-            for suffix in affixes: variations.add(word + str(suffix))
-        for word in words_to_affix: # Prefixes
-            for prefix in affixes: variations.add(str(prefix) + word)
-            for prefix in DEFAULT_PREFIXES: variations.add(prefix + word)
+        for word in words: variations.update(self._iter_affixes(word))
         log.debug(f"Affix variations generated: {len(variations)}")
         return variations
 
+    def _add_pattern_terms(self, product, group, room, need):
+        """Adds the Word/Num/Symbol pattern products of words that share one (room, need) budget to a FactoredSet."""
+        nums = self.pattern_nums.select(room, need); symbols = self.pattern_symbols.select(room, need)
+        # Num/Symbol pairs that still fit next to the word and supply the missing classes together
+        pairs = [((num,), self.pattern_symbols.select(room - len(num) if room is not None else None, need - char_classes(num)))
+                 for num in self.pattern_nums.select(room)]
+        built_pairs = sum(len(syms) for _, syms in pairs)
+        self.policy.pruned_early += len(group) * (2 * (self.pattern_nums.total - len(nums)) + 2 * (self.pattern_symbols.total - len(symbols))
+                                                  + 4 * (self.pattern_nums.total * self.pattern_symbols.total - built_pairs))
+        product.add(group, nums) # Word + Num
+        product.add(group, symbols) # Word + Symbol
+        product.add(nums, group) # Num + Word
+        product.add(symbols, group) # Symbol + Word
+        for num, syms in pairs: product.add(group, num, syms) # Word + Num + Symbol
+        for num, syms in pairs: product.add(group, syms, num) # Word + Symbol + Num
+        for num, syms in pairs: product.add(syms, group, num) # Symbol + Word + Num
+        for num, syms in pairs: product.add(num, group, syms) # Num + Word + Symbol
+
+    def _factor_patterns(self, words):
+        """Returns the pattern variants of words as a lazy FactoredSet."""
+        product = FactoredSet()
+        for (room, need), group in self._budget_groups(words, 'Patterns'): self._add_pattern_terms(product, group, room, need)
+        return product
+
+    def _iter_patterns(self, word):
+        """Yields common Word/Num/Symbol patterns built around a single word."""
+        product = FactoredSet(); self._add_pattern_terms(product, (word,), *self._budget(word, 'Patterns'))
+        yield from product
+
     def _apply_patterns(self, words):
         """Generates passwords based on common patterns like Word+Num+Symbol."""
         if not words: return set()
         log.debug("Applying pattern transformations...")
         variations = set()
-        # Define elements for patterns
-        nums = NUMBERS_SIMPLE + (list(self.date_parts.values()) if not self.args.no_dates else []) + (YEARS if not self.args.no_years else []) + (YEARS_YY if not self.args.no_years else [])
-        symbols = SYMBOLS_COMMON # Use a smaller set for patterns to avoid excessive size
-
-        # Use a copy to iterate over
-        words_to_pattern = list(words)
-        for word in words_to_pattern:
-             # Word + Num
-             for num in nums: variations.add(word + str(num))
-             # Word + Symbol
-             for sym in symbols: variations.add(word + str(sym))
-             # Num + Word
-             for num in nums: variations.add(str(num) + word)
-             # Symbol + Word
-             for sym in symbols: variations.add(str(sym) + word)
-             # Word + Num + Symbol
-             for num in nums:
-                  for sym in symbols: variations.add(word + str(num) + str(sym))
-             # Word + Symbol + Num
-             for sym in symbols:
-                  for num in nums: variations.add(word + str(sym) + str(num))
-             # Symbol + Word + Num
-             for sym in symbols:
-                  for num in nums: variations.add(str(sym) + word + str(num))
-             # Num + Word + Symbol
-             for num in nums:
-                  for sym in symbols: variations.add(str(num) + word + str(sym))
-
+        for word in words: variations.update(self._iter_patterns(word))
         log.debug(f"Pattern variations generated: {len(variations)}")
         return variations
 
+    def _iter_combinations(self, w1, initial_bases, with_affixes=True, terminal=True):
+        """Yields the combinations that start with base word w1 (pairs and date/year affixes)."""
+        cap1 = w1.capitalize(); can_build = self.policy.can_build
+        for w2 in initial_bases:
+            if w2 == w1: continue
+            for parts in ((w1, w2), (cap1, w2.capitalize()), (w1, "_", w2), (w1, "-", w2)):
+                if can_build(parts, terminal): yield "".join(parts)
+        if not with_affixes: return
+        for affix_str in self.combo_affixes:
+            for parts in ((w1, affix_str), (affix_str, w1), (cap1, affix_str), (affix_str, cap1), (w1, "_", affix_str), (affix_str, "_", w1)):
+                if can_build(parts, terminal): yield "".join(parts)
+
     def _apply_combinations(self, words):
         """Combines base words with each other and with date parts/years."""
-        # (Same logic as v2.0)
         if not self.base_words or (len(self.base_words) < 2 and not self.date_parts): return set() # Use base_words
         log.debug("Applying combination transformations...")
-        variations = set(); initial_bases = list(self.base_words) # Use base_words
-        date_elements = list(self.date_parts.values()) if not self.args.no_dates else []
-        year_elements = list(YEARS) if not self.args.no_years else []; combined_date_years = set(date_elements) | set(year_elements)
-        if len(initial_bases) >= 2:
-             for w1, w2 in itertools.permutations(initial_bases, 2):
-                  variations.add(w1 + w2); variations.add(w1.capitalize() + w2.capitalize()); variations.add(w1 + "_" + w2); variations.add(w1 + "-" + w2)
-        for word in initial_bases:
-             for affix in combined_date_years:
-                  affix_str = str(affix)
-                  variations.add(word + affix_str); variations.add(affix_str + word); variations.add(word.capitalize() + affix_str); variations.add(affix_str + word.capitalize()); variations.add(word + "_" + affix_str); variations.add(affix_str + "_" + word)
+        variations = set(); initial_bases = sorted(self.base_words) # Use base_words
+        for w1 in initial_bases: variations.update(self._iter_combinations(w1, initial_bases))
         log.debug(f"Combination variations generated: {len(variations)}")
         return variations
 
+    def _filter_stream(self, words):
+        """Lazily filters candidates against the exclusion index and the policy, counting late rejections."""
+        policy = self.policy
+        if self.exclusion: words = self.exclusion.novel(words)
+        for word in words:
+            if policy.accepts(word): yield word
+            else: policy.filtered_late += 1
 
     def filter_wordlist(self, words):
-        """Filters the wordlist based on length constraints."""
-        # (Same as v2.0)
-        min_len = self.args.min_len; max_len = self.args.max_len
-        if min_len is None and max_len is None: return words
-        log.info(f"Applying filters: Min Length={min_len}, Max Length={max_len}")
+        """Filters the wordlist based on length and policy constraints."""
+        if not self.policy.active: return words
+        log.info(f"Applying filters: {self.policy.describe()}")
         original_count = len(words)
-        filtered_words = {word for word in words if (min_len is None or len(word) >= min_len) and (max_len is None or len(word) <= max_len)}
+        filtered_words = {word for word in words if self.policy.accepts(word)}
+        self.policy.filtered_late += original_count - len(filtered_words)
         log.info(f"Total words after filtering: {len(filtered_words)} (Removed: {original_count - len(filtered_words)})")
         return filtered_words
 
+    def exclude_known(self, words):
+        """Removes the words found in the --exclude-wordlist index."""
+        original_count = len(words)
+        remaining = set(self.exclusion.novel(words))
+        log.info(f"Total words after exclusion: {len(remaining)} (Removed: {original_count - len(remaining)} found in {self.args.exclude_wordlist})")
+        return remaining
+
+    def _pipeline(self):
+        """Returns the per-word stages as (name, set_func, word_func, disabled_flag) in pipeline order."""
+        stages = [
+            ('Case', self._apply_case, self._iter_case, self.args.no_case),
+            ('Leet', self._apply_leet, self._iter_leet, self.args.leet_level == 'none'),
+            ('Reverse', self._apply_reverse, self._iter_reverse, not self.args.reverse),
+            # Apply next steps to the expanded set
+            ('Insertions', self._apply_insertions, self._iter_insertions, self.args.no_insertions),
+            ('Affixes', self._apply_affixes, self._iter_affixes, self.args.no_numbers and self.args.no_symbols and self.args.no_dates),
+            ('Patterns', self._apply_patterns, self._iter_patterns, self.args.no_patterns),
+        ]
+        return [(name, func, step, disabled_flag or name in self.trimmed_stages) for name, func, step, disabled_flag in stages]
+
+    def _combinations_enabled(self):
+        return not self.args.no_combinations and 'Combinations' not in self.trimmed_stages and (len(self.base_words) >= 2 or bool(self.date_parts))
+
     def generate(self):
         """Generates the final wordlist by applying transformations sequentially."""
         if not self.base_words: log.warning("No base keywords loaded."); return []
 
         log.info(f"Starting generation with {len(self.base_words)} base words.")
-        # Define the pipeline
-        pipeline = [
-            ('Base', lambda w: set(w), False), # Start with base (added False as placeholder)
-            ('Case', self._apply_case, self.args.no_case),
-            ('Leet', self._apply_leet, self.args.leet_level == 'none'),
-            ('Reverse', self._apply_reverse, not self.args.reverse),
-            # Apply next steps to the expanded set
-            ('Insertions', self._apply_insertions, self.args.no_insertions),
-            ('Affixes', self._apply_affixes, self.args.no_numbers and self.args.no_symbols and self.args.no_dates),
-            ('Patterns', self._apply_patterns, self.args.no_patterns),
-            ('Combinations', self._apply_combinations, self.args.no_combinations),
-        ]
+        profiler = StageProfiler() if self.args.profile else None
+        processed_stages = set(self.base_words) # Keep track of all words generated so far
 
-        current_words = set(self.base_words)
-        processed_stages = set(current_words) # Keep track of all words generated so far
-
-        for name, func, disabled_flag in pipeline:
-            if name == 'Base': continue # Skip base step func
-            if name == 'Combinations':
-                 # Combinations use initial base words, add results to processed_stages
-                 if not disabled_flag:
-                      combination_words = func(self.base_words) # Use base_words instead of base_keywords
-                      processed_stages.update(combination_words)
-            elif not disabled_flag:
-                 # Apply transformation to the words generated *up to the previous stage*
-                 # to avoid applying affixes/patterns to already affixed/patterned words excessively?
-                 # Or apply to *all* words generated so far (processed_stages)? Let's try all.
-                 new_words = func(processed_stages)
-                 processed_stages.update(new_words) # Add newly generated words
+        for name, func, _, disabled_flag in self._pipeline():
+            if disabled_flag: continue
+            # Apply each transformation to *all* words generated so far (processed_stages)
+            if profiler: profiler.run(name, func, processed_stages, processed_stages)
+            else: processed_stages.update(func(processed_stages))
+        # Combinations use initial base words, add results to processed_stages
+        if self._combinations_enabled():
+            if profiler: profiler.run('Combinations', self._apply_combinations, self.base_words, processed_stages)
+            else: processed_stages.update(self._apply_combinations(self.base_words))
 
         log.info(f"Total words before filtering: {len(processed_stages)}")
-        final_wordlist = self.filter_wordlist(processed_stages)
-        return sorted(list(final_wordlist))
+        if self.exclusion:
+            if profiler: processed_stages = profiler.run('Exclude', self.exclude_known, processed_stages)
+            else: processed_stages = self.exclude_known(processed_stages)
+        if profiler:
+            final_wordlist = profiler.run('Filter', self.filter_wordlist, processed_stages)
+            profiler.write(self.args.profile, base_words=len(self.base_words), final_candidates=len(final_wordlist))
+        else: final_wordlist = self.filter_wordlist(processed_stages)
+        return sorted(final_wordlist)
 
+    def estimate(self):
+        """Estimates candidate counts per stage without building the candidates.
 
-    def run_and_output(self):
-        """Runs the generation and handles output."""
-        # (Same as v2.0)
-        final_list = self.generate()
-        if not final_list: log.warning("Generated wordlist is empty."); return
-        output_content = "\n".join(final_list)
-        if self.args.output_file:
-            log.info(f"Saving wordlist ({len(final_list)} words) to {self.args.output_file}")
+        Returns (stage, count, exact) rows: the size of the accumulated set after
+        each enabled word stage, then Combinations and Total. Case, simple leet and
+        reverse are counted exactly by expanding the (small) word-level sets while
+        no bound has been used yet; every other count is an upper bound before
+        dedupe and length filtering.
+        """
+        words = set(self.base_words); count = len(words); exact = True
+        rows = [('Base', count, True)]
+        for name, func, _, disabled_flag in self._pipeline():
+            if disabled_flag: continue
+            if exact and (name in ('Case', 'Reverse') or (name == 'Leet' and self.args.leet_level == 'simple')):
+                words = words | func(words); count = len(words)
+            elif name == 'Leet': # Full leet; Case (always first) has kept the set exact
+                bound = 0
+                for word in words:
+                    bound += 1 + 2 * count_leet_variants(word, LEET_MAP_FULL, self.args.leet_max_subs, self.args.leet_max_variants)
+                count = bound
+                exact = False
+            elif name == 'Reverse': count *= 3
+            elif name == 'Insertions': count *= 1 + 2 * self.insert_chars.total; exact = False
+            elif name == 'Affixes': count *= 1 + 2 * self.affixes.total + self.prefixes.total; exact = False
+            elif name == 'Patterns':
+                nums = self.pattern_nums.total; symbols = self.pattern_symbols.total
+                count *= 1 + 2 * nums + 2 * symbols + 4 * nums * symbols; exact = False
+            rows.append((name, count, exact))
+        combinations = 0
+        if self._combinations_enabled():
+            n = len(self.base_words); combinations = 4 * n * (n - 1) + 6 * n * len(self.combo_affixes)
+            rows.append(('Combinations', combinations, False))
+        rows.append(('Total', count + combinations, exact and not combinations))
+        return rows
+
+    def print_estimate(self):
+        """Prints the per-stage estimate table (dry run)."""
+        rows = self.estimate()
+        print(f"{'Stage':<14}{'Candidates':>22}")
+        for name, count, exact in rows: print(f"{name:<14}{count:>22,}  {'(exact)' if exact else '(upper bound)'}")
+        if self.args.max_candidates:
+            print(f"{'Budget':<14}{self.args.max_candidates:>22,}  {'(within budget)' if rows[-1][1] <= self.args.max_candidates else '(EXCEEDED)'}")
+
+    def apply_candidate_budget(self, max_candidates):
+        """Refuses to run, or trims stages with --trim-stages, when the estimate exceeds max_candidates."""
+        total = self.estimate()[-1][1]
+        if total <= max_candidates: return
+        if not self.args.trim_stages:
+            raise ValueError(f"Estimated {total:,} candidates exceeds --max-candidates {max_candidates:,}. Disable stages or use --trim-stages.")
+        for stage in TRIM_ORDER:
+            if stage == 'Leet:full':
+                if self.args.leet_level != 'full': continue
+                self.args.leet_level = 'simple'
+            elif stage == 'Combinations':
+                if not self._combinations_enabled(): continue
+                self.trimmed_stages.add(stage)
+            elif next(disabled_flag for name, _, _, disabled_flag in self._pipeline() if name == stage): continue
+            else: self.trimmed_stages.add(stage)
+            self._build_tables() # The terminal stage may have changed
+            total = self.estimate()[-1][1]
+            log.warning(f"Trimmed stage {stage} to fit --max-candidates: estimate now {total:,}")
+            if total <= max_candidates: return
+        raise ValueError(f"Estimated {total:,} candidates still exceeds --max-candidates {max_candidates:,} with every stage trimmed.")
+
+    def _chain_stage(self, words, step, dedupe=True):
+        """Lazily applies one stage: yields each input word followed by its new variations."""
+        if not dedupe:
+            for word in words: yield word; yield from step(word)
+            return
+        seen = set() # Scoped to one base word, so it stays small
+        for word in words:
+            for variant in itertools.chain((word,), step(word)):
+                if variant not in seen: seen.add(variant); yield variant
+
+    def _stream_word(self, word):
+        """Runs the pipeline for one base word as a chain of generators."""
+        steps = [step for name, _, step, disabled_flag in self._pipeline() if not disabled_flag]
+        stream = iter((word,))
+        for i, step in enumerate(steps):
+            # The last stage feeds nothing, so its output is not held in a dedupe set
+            stream = self._chain_stage(stream, step, dedupe=i < len(steps) - 1)
+        return stream
+
+    def iter_candidates(self, new_words=None, old_affixes=False):
+        """Lazily yields filtered candidates one base word at a time.
+
+        Memory is bounded by the intermediate stages of a single base word;
+        the output is not globally deduplicated and may repeat candidates.
+        With new_words, only candidates built from at least one of those base
+        words are generated (every stage works on one base word at a time);
+        old_affixes also yields the date/year combinations of the other words.
+        """
+        initial_bases = sorted(self.base_words)
+        targets = initial_bases if new_words is None else sorted(new_words)
+        for word in targets:
+            yield from self._filter_stream(self._stream_word(word))
+        if self._combinations_enabled():
+            for w1 in initial_bases:
+                if new_words is None or w1 in new_words: combinations = self._iter_combinations(w1, initial_bases)
+                else: combinations = self._iter_combinations(w1, targets, with_affixes=old_affixes) # Only pairs with a new word
+                yield from self._filter_stream(dict.fromkeys(combinations)) # Dedupe per first word
+
+    def _state_key(self):
+        """Returns the key of the options a --state index was built with (target fields excluded)."""
+        config = dataclasses.replace(GeneratorConfig.from_args(self.args), **{f: None for f in TARGET_FIELDS},
+                                     top=None, stream=False, state=None, rank_weights=None, max_candidates=None, trim_stages=False)
+        return json.dumps([config.cache_key(), sorted(self.trimmed_stages), YEARS])
+
+    def _generate_incremental(self):
+        """Yields, sorted, only the candidates that earlier runs with the same --state DIR have not emitted.
+
+        When the options and birth date match the saved state, only base words
+        that are new since the last run are expanded; otherwise everything is
+        regenerated and checked against the index. The index is updated once
+        the output has been written completely (see commit_state()).
+        """
+        state = IncrementalState(self.args.state)
+        previous = state.manifest; config_key = self._state_key()
+        known_words = set(previous.get('base_words', ()))
+        if previous.get('config_key') == config_key and previous.get('date_parts') == self.date_parts:
+            new_words = self.base_words - known_words
+            log.info(f"State {self.args.state}: {len(state.index)} candidates already emitted; {len(new_words)} new of {len(self.base_words)} base words to expand.")
+            old_affixes = self._combinations_enabled() and not previous.get('combinations') # Enabled by the second base word
+            candidates = self.iter_candidates(new_words, old_affixes); known_words |= self.base_words
+        else:
+            if previous: log.info(f"State {self.args.state}: options or birth date changed; regenerating everything and emitting only unseen candidates.")
+            candidates = self.iter_candidates(); known_words = set(self.base_words)
+        skipped = 0
+        try:
+            with SpillingSet(self.args.mem_limit or float('inf')) as fresh:
+                for candidate in candidates:
+                    if state.seen(fingerprint(candidate)): skipped += 1
+                    else: fresh.add(candidate)
+                new_fingerprints = array('Q')
+                for candidate in fresh: new_fingerprints.append(fingerprint(candidate)); yield candidate
+            log.info(f"State: {len(new_fingerprints)} new candidates, {skipped} already emitted candidates skipped.")
+            self._state_update = (new_fingerprints, {'version': __version__, 'config_key': config_key, 'date_parts': self.date_parts, 'base_words': sorted(known_words), 'combinations': self._combinations_enabled()})
+        finally: state.close()
+
+    def commit_state(self):
+        """Records the candidates of a finished --state run as emitted. Call only once the output is safely written."""
+        if self._state_update is None: return
+        state = IncrementalState(self.args.state)
+        try: state.commit(*self._state_update)
+        finally: state.close(); self._state_update = None
+
+    def _graph_stage(self, stage, words, lazy=False):
+        """Returns the output of one stage-graph node for its input words (a FactoredSet for lazy affixes/patterns)."""
+        if stage == 'combinations':
+            initial_bases = sorted(self.base_words); terminal = 'Combinations' in self._terminal_stages
+            return {c for w1 in initial_bases for c in self._iter_combinations(w1, initial_bases, terminal=terminal)}
+        if stage in ('affixes', 'patterns'):
+            product = self._factor_affixes(words) if stage == 'affixes' else self._factor_patterns(words)
+            return product if lazy else set(product)
+        step = {'case': self._iter_case, 'leet': self._iter_leet, 'reverse': self._iter_reverse, 'insertions': self._iter_insertions}[stage]
+        return {v for word in words for v in step(word)}
+
+    def _evaluate_graph(self, profiler=None):
+        """Computes the stage-graph nodes in dependency order. Returns {output node: set or FactoredSet}.
+
+        Each node is computed once and shared by all its consumers; unions of
+        several inputs are memoized by input set. Nodes and unions are dropped
+        after their last consumer. Affix and pattern nodes that feed no other
+        stage stay factorized until output.
+        """
+        graph = self.stage_graph
+        disabled = {name.lower(): disabled_flag for name, _, _, disabled_flag in self._pipeline()}
+        disabled['combinations'] = not self._combinations_enabled()
+        uses = collections.Counter(i for _, _, inputs in graph.nodes for i in inputs)
+        uses.update(frozenset(inputs) for _, _, inputs in graph.nodes if len(inputs) > 1)
+        values = {'base': self.base_words}; unions = {}
+        for name, stage, inputs in graph.nodes:
+            if disabled[stage]: log.info(f"Stage graph: {name} ({stage}) is disabled"); values[name] = set()
+            else:
+                if len(inputs) > 1:
+                    key = frozenset(inputs)
+                    if key not in unions: unions[key] = set().union(*(values[i] for i in inputs))
+                    words = unions[key]
+                else: words = values[inputs[0]] if inputs else self.base_words
+                lazy = stage in ('affixes', 'patterns') and name not in graph.consumed
+                func = functools.partial(self._graph_stage, stage, lazy=lazy)
+                values[name] = profiler.run(name, func, words) if profiler else func(words)
+                log.info(f"Stage graph: {name} ({stage}) <- {'+'.join(inputs) or 'base'}: {len(words)} in, {len(values[name])} {'products (lazy)' if lazy else 'out'}")
+            for key in inputs + ([frozenset(inputs)] if len(inputs) > 1 else []):
+                uses[key] -= 1
+                if uses[key]: continue
+                if isinstance(key, frozenset): unions.pop(key, None)
+                elif key != 'base' and key not in graph.outputs: del values[key]
+        return {name: values[name] for name in graph.outputs}
+
+    def _generate_graph(self):
+        """Yields the sorted, unique wordlist of the --stage-graph (unsorted, not globally deduplicated with --stream)."""
+        log.info(f"Starting stage-graph generation with {len(self.base_words)} base words: {self.stage_graph.describe()}")
+        profiler = StageProfiler() if self.args.profile else None
+        outputs = self._evaluate_graph(profiler)
+        if self.args.stream: yield from self._filter_stream(itertools.chain.from_iterable(outputs.values())); return
+        count = 0
+        with SpillingSet(self.args.mem_limit or float('inf')) as unique_words:
+            while outputs: unique_words.update(outputs.popitem()[1]) # Lazy products are expanded here
+            for word in self._filter_stream(unique_words): count += 1; yield word
+        log.info(f"Total unique words after filtering: {count}")
+        if profiler: profiler.write(self.args.profile, base_words=len(self.base_words), final_candidates=count)
+
+    def _generate_spilling(self):
+        """Yields the same sorted, unique list as generate(), keeping the dedupe set under --mem-limit."""
+        log.info(f"Starting generation with {len(self.base_words)} base words (memory budget: {self.args.mem_limit} bytes).")
+        with SpillingSet(self.args.mem_limit) as unique_words:
+            unique_words.update(self.iter_candidates())
+            yield from unique_words
+            log.info(f"External dedupe finished: {len(unique_words.runs)} runs spilled, {unique_words.spilled_bytes} bytes written.")
+
+    def _generate_sharded(self, workers):
+        """Runs the pipeline on a process pool and yields the same sorted, unique list as generate().
+
+        Base words (and combination first words) are split into tasks; each worker
+        writes its candidates to per-process partition files chosen by hash, each
+        partition is deduplicated and sorted on its own, and the sorted partitions
+        are merged. No single process ever holds the global set.
+        """
+        initial_bases = sorted(self.base_words)
+        chunk = max(1, -(-len(initial_bases) // (workers * 4)))
+        tasks = [('words', initial_bases[i:i + chunk]) for i in range(0, len(initial_bases), chunk)]
+        if self._combinations_enabled():
+            tasks += [('combinations', initial_bases[i:i + chunk]) for i in range(0, len(initial_bases), chunk)]
+        log.info(f"Starting sharded generation: {len(initial_bases)} base words, {len(tasks)} tasks, {workers} workers/partitions.")
+        with tempfile.TemporaryDirectory(prefix='passforge-') as tmpdir:
+            with multiprocessing.Pool(workers, initializer=_shard_worker_init, initargs=(self, tmpdir, workers)) as pool:
+                for pruned_early, filtered_late, excluded in pool.imap_unordered(_shard_generate_task, tasks):
+                    self.policy.pruned_early += pruned_early; self.policy.filtered_late += filtered_late
+                    if self.exclusion: self.exclusion.excluded += excluded
+                sorted_paths = []; total = 0
+                for path, count in pool.imap(_shard_dedupe_task, range(workers)):
+                    sorted_paths.append(path); total += count
+            log.info(f"Total unique words after filtering: {total}")
+            files = [open(path, 'r', encoding='utf-8') for path in sorted_paths]
             try:
-                with open(self.args.output_file, 'w', encoding='utf-8') as f: f.write(output_content + "\n")
-                log.info("Wordlist saved successfully.")
-            except IOError as e: log.error(f"Failed to write wordlist to {self.args.output_file}: {e}")
-            except Exception as e: log.error(f"Unexpected error saving wordlist: {e}")
-        else: print(output_content)
+                # Partitions are disjoint, so a plain merge keeps the output unique
+                yield from heapq.merge(*((line[:-1] for line in f) for f in files))
+            finally:
+                for f in files: f.close()
+
+    def iter_ranked(self, limit, weights=None):
+        """Yields up to limit filtered candidates, most likely first.
+
+        Best-first search over the stage graph: every state is (word, next stage)
+        and costs -log of the product of the weights of the stages applied so far;
+        skipping a stage is free. Each stage's variants come from a lazy iterator
+        that sits on the heap at the cost of its children and is advanced one
+        variant per pop, so only candidates that can still make the top N are built.
+        """
+        weights = weights or load_rank_weights(self.args.rank_weights)
+        stages = [(name, step) for name, _, step, disabled_flag in self._pipeline() if not disabled_flag]
+        final = len(stages); cost_of = {name: -math.log(weights[name.lower()]) for name, _ in stages}
+        heap = []; counter = itertools.count(); visited = set(); finished = set(); emitted = 0
+        base_cost = -math.log(weights['base'])
+        for word in sorted(self.base_words): heapq.heappush(heap, (base_cost, next(counter), word, 0, None))
+        if self._combinations_enabled():
+            initial_bases = sorted(self.base_words)
+            combinations = (c for w1 in initial_bases for c in self._iter_combinations(w1, initial_bases))
+            heapq.heappush(heap, (-math.log(weights['combinations']), next(counter), None, final, combinations))
+        while heap and emitted < limit:
+            cost, _, word, index, variants = heapq.heappop(heap)
+            if variants is not None: # Lazy stage expansion: take one variant, keep the rest queued
+                word = next(variants, None)
+                if word is None: continue
+                heapq.heappush(heap, (cost, next(counter), None, index, variants))
+            if index == final:
+                if word in finished: continue
+                finished.add(word)
+                if self.exclusion and fingerprint(word) in self.exclusion: self.exclusion.excluded += 1
+                elif self.policy.accepts(word): emitted += 1; yield word
+                else: self.policy.filtered_late += 1
+                continue
+            if (word, index) in visited: continue
+            visited.add((word, index))
+            name, step = stages[index]
+            heapq.heappush(heap, (cost, next(counter), word, index + 1, None)) # Skip the stage
+            heapq.heappush(heap, (cost + cost_of[name], next(counter), None, index + 1, step(word)))
+        log.info(f"Ranked search finished: {emitted} candidates emitted, {len(visited)} states expanded.")
+
+    def candidates(self, ordered=True):
+        """Returns the candidates for the configured mode, or None when there is nothing to generate.
+
+        The default mode returns the sorted list; stream, top, workers and mem-limit
+        runs return an iterator. With ordered=False the default mode streams the
+        unsorted candidates (duplicates included) instead of building the list.
+        """
+        if self.args.max_candidates: self.apply_candidate_budget(self.args.max_candidates)
+        if self.stage_graph:
+            if not self.base_words: log.warning("No base keywords loaded."); return None
+            candidates = self._generate_graph()
+        elif self.args.stream:
+            if not self.base_words: log.warning("No base keywords loaded."); return None
+            log.info(f"Streaming candidates from {len(self.base_words)} base words to {self.args.output_file or 'stdout'}")
+            candidates = self.iter_candidates()
+        elif self.args.top:
+            if not self.base_words: log.warning("No base keywords loaded."); return None
+            log.info(f"Generating the top {self.args.top} ranked candidates from {len(self.base_words)} base words.")
+            candidates = self.iter_ranked(self.args.top, load_rank_weights(self.args.rank_weights))
+        elif self.args.state:
+            if not self.base_words: log.warning("No base keywords loaded."); return None
+            candidates = self._generate_incremental()
+        elif self.args.workers > 1:
+            if not self.base_words: log.warning("No base keywords loaded."); return None
+            candidates = self._generate_sharded(self.args.workers)
+        elif self.args.mem_limit:
+            if not self.base_words: log.warning("No base keywords loaded."); return None
+            candidates = self._generate_spilling()
+        elif not ordered:
+            if not self.base_words: log.warning("No base keywords loaded."); return None
+            log.info(f"Streaming unsorted candidates from {len(self.base_words)} base words.")
+            candidates = self.iter_candidates()
+        else:
+            candidates = self.generate()
+            if not candidates: log.warning("Generated wordlist is empty."); return None
+        return candidates
+
+    def run_and_output(self):
+        """Runs the generation and handles output. Returns the number of candidates written, or None if nothing was written.
+
+        Write errors are logged and kept in write_error.
+        """
+        candidates = self.candidates()
+        if candidates is None: return
+        pipe = getattr(self.args, 'pipe', None); destination = pipe or self.args.output_file or 'stdout'
+        if isinstance(candidates, list) and (pipe or self.args.output_file): log.info(f"Saving wordlist ({len(candidates)} words) to {destination}")
+        count = None
+        try:
+            with open_output(self.args.output_file, pipe) as out: written = write_candidates(out, candidates)
+            count = written # Set only once the output has been flushed and closed
+            if pipe: log.info(f"Piped {count} words to {pipe}")
+            elif self.args.output_file: log.info(f"Wordlist saved successfully ({count} words).")
+        except IOError as e: self.write_error = f"Failed to write wordlist to {destination}: {e}"; log.error(self.write_error)
+        except Exception as e: self.write_error = f"Unexpected error saving wordlist: {e}"; log.error(self.write_error)
+        if count is not None: self.commit_state()
+        elif self._state_update: log.warning(f"State {self.args.state} not updated: the output was not written in full.")
+        log.info(f"Constraint stats: {self.policy.pruned_early} candidates pruned early, {self.policy.filtered_late} filtered late")
+        if self.exclusion and not isinstance(candidates, list): log.info(f"Exclusion: {self.exclusion.excluded} candidates already in {self.args.exclude_wordlist}")
+        return count
 
     def close(self):
         """Cleans up resources."""
+        if self.exclusion: self.exclusion.close()
         log.info("PassForge finished.")
 
 
-# --- Entry Point ---
-if __name__ == "__main__":
+# --- Worker Processes (--workers) ---
+_shard_state = {}
+
+def _shard_worker_init(generator, tmpdir, partitions):
+    """Pool initializer: keeps the generator and partition layout in the worker process."""
+    _shard_state.update(generator=generator, tmpdir=tmpdir, partitions=partitions)
+
+def _shard_generate_task(task):
+    """Generates one task's candidates and appends them to this process's partition files."""
+    generator = _shard_state['generator']; partitions = _shard_state['partitions']
+    kind, words = task
+    policy = generator.policy; policy.pruned_early = policy.filtered_late = 0
+    if generator.exclusion: generator.exclusion.excluded = 0
+    if kind == 'words': candidates = (c for word in words for c in generator._filter_stream(generator._stream_word(word)))
+    else:
+        initial_bases = sorted(generator.base_words)
+        candidates = (c for w1 in words for c in generator._filter_stream(dict.fromkeys(generator._iter_combinations(w1, initial_bases))))
+    files = [open(os.path.join(_shard_state['tmpdir'], f"part{p}-{os.getpid()}.txt"), 'a', encoding='utf-8', buffering=OUTPUT_BUFFER_SIZE // partitions or 1) for p in range(partitions)]
+    try:
+        for candidate in candidates: files[zlib.crc32(candidate.encode('utf-8')) % partitions].write(candidate + "\n")
+    finally:
+        for f in files: f.close()
+    return policy.pruned_early, policy.filtered_late, generator.exclusion.excluded if generator.exclusion else 0
+
+def _shard_dedupe_task(partition):
+    """Deduplicates and sorts one partition. Returns (sorted file path, unique count)."""
+    tmpdir = _shard_state['tmpdir']; prefix = f"part{partition}-"
+    mem_limit = _shard_state['generator'].args.mem_limit
+    # Each partition gets an equal share of --mem-limit, or an unbounded budget without it
+    with SpillingSet(mem_limit // _shard_state['partitions'] if mem_limit else float('inf'), tmpdir) as words:
+        for name in os.listdir(tmpdir):
+            if name.startswith(prefix):
+                with open(os.path.join(tmpdir, name), 'r', encoding='utf-8') as f: words.update(line[:-1] for line in f)
+        path = os.path.join(tmpdir, f"sorted{partition}.txt"); count = 0
+        with open(path, 'w', encoding='utf-8', buffering=OUTPUT_BUFFER_SIZE) as f:
+            for word in words: f.write(word + "\n"); count += 1
+    return path, count
+
+
+def iter_chunks(candidates):
+    """Groups candidates into newline-terminated text chunks. Yields (line count, text)."""
+    chunk = []
+    for candidate in candidates:
+        chunk.append(candidate)
+        if len(chunk) >= WRITE_CHUNK_LINES: yield len(chunk), "\n".join(chunk) + "\n"; chunk = []
+    if chunk: yield len(chunk), "\n".join(chunk) + "\n"
+
+
+# --- Output Formats ---
+COMPRESSED_OPENERS = {'.gz': functools.partial(gzip.open, compresslevel=6), '.xz': lzma.open, '.bz2': bz2.open}
+
+def open_output(output_file=None, pipe=None):
+    """Opens the output destination: a --pipe command's stdin, a .pfc/.gz/.xz/.bz2/text file, or stdout."""
+    if pipe: return _pipe_output(pipe)
+    if not output_file: return contextlib.nullcontext(sys.stdout)
+    extension = os.path.splitext(output_file)[1].lower()
+    if extension == '.pfc': return FrontCodedWriter(output_file)
+    if extension in COMPRESSED_OPENERS: return COMPRESSED_OPENERS[extension](output_file, 'wt', encoding='utf-8')
+    return open(output_file, 'w', encoding='utf-8', buffering=OUTPUT_BUFFER_SIZE)
+
+@contextlib.contextmanager
+def _pipe_output(command):
+    """Runs command and yields its stdin. Blocking writes give backpressure; the exit status is checked on close."""
+    process = subprocess.Popen(shlex.split(command), stdin=subprocess.PIPE, encoding='utf-8', bufsize=OUTPUT_BUFFER_SIZE)
+    try: yield process.stdin
+    finally:
+        try: process.stdin.close()
+        except BrokenPipeError: pass # The command stopped reading; already reported by the writer
+        status = process.wait()
+        if status: log.warning(f"Pipe command exited with status {status}: {command}")
+
+def write_candidates(out, candidates):
+    """Writes candidates to an open_output() destination. Returns the number written.
+
+    A --pipe command that stops reading ends the run early instead of failing it.
+    """
+    if isinstance(out, FrontCodedWriter): return out.write_words(candidates)
+    count = 0
+    try:
+        for lines, text in iter_chunks(candidates): out.write(text); count += lines
+    except BrokenPipeError:
+        if out is sys.stdout: raise
+        log.warning(f"Output command closed its input; stopped after {count} candidates.")
+    return count
+
+def _encode_varint(n):
+    data = bytearray()
+    while n >= 0x80: data.append((n & 0x7F) | 0x80); n >>= 7
+    data.append(n)
+    return data
+
+def _decode_varint(data, pos):
+    """Returns (value, next position)."""
+    value = shift = 0
+    while True:
+        byte = data[pos]; pos += 1
+        value |= (byte & 0x7F) << shift; shift += 7
+        if byte < 0x80: return value, pos
+
+
+class FrontCodedWriter:
+    """Writes sorted, unique candidates as a front-coded wordlist (.pfc).
+
+    Words are grouped in blocks of PFC_BLOCK_SIZE. The first word of a block is
+    stored whole and every other word as (shared prefix length, suffix) against
+    its predecessor. A table of block offsets and a footer follow the blocks,
+    so FrontCodedReader can seek to any word or shard without scanning. The
+    file is written under a temporary name and only appears at path once
+    close() has written the footer; a with block that fails discards it.
+    """
+    HEADER = struct.Struct('<4sI') # Magic, block size
+    FOOTER = struct.Struct('<QQ4s') # Word count, block table offset, magic
+    MAGIC = b'PFC1'
+
+    def __init__(self, path, block_size=PFC_BLOCK_SIZE):
+        self.path = path; self.block_size = block_size
+        self._file = open(path + '.tmp', 'wb', buffering=OUTPUT_BUFFER_SIZE); self._file.write(self.HEADER.pack(self.MAGIC, block_size))
+        self._position = self.HEADER.size; self._offsets = array('Q'); self._block = bytearray(); self._previous = None
+        self.count = 0
+
+    def __enter__(self): return self
+
+    def __exit__(self, exc_type, *exc_info):
+        if exc_type is None: self.close()
+        else: self.abort()
+
+    def add(self, word):
+        data = word.encode('utf-8'); previous = self._previous
+        if previous is not None and data <= previous: raise ValueError(f".pfc output needs sorted, unique candidates ('{word}' after '{previous.decode('utf-8')}')")
+        if self.count % self.block_size == 0:
+            self._flush_block(); self._offsets.append(self._position)
+            self._block += _encode_varint(len(data)); self._block += data
+        else:
+            shared = 0; limit = min(len(data), len(previous))
+            while shared < limit and data[shared] == previous[shared]: shared += 1
+            self._block += _encode_varint(shared); self._block += _encode_varint(len(data) - shared); self._block += data[shared:]
+        self._previous = data; self.count += 1
+
+    def write_words(self, words):
+        """Adds every word. Returns the number added."""
+        start = self.count
+        for word in words: self.add(word)
+        return self.count - start
+
+    def _flush_block(self):
+        if self._block: self._file.write(self._block); self._position += len(self._block); self._block = bytearray()
+
+    def close(self):
+        if self._file.closed: return
+        self._flush_block()
+        padding = -self._position % 8 # Keep the block table 8-byte aligned for the reader's memoryview
+        self._file.write(b'\0' * padding); self._offsets.tofile(self._file)
+        self._file.write(self.FOOTER.pack(self.count, self._position + padding, self.MAGIC)); self._file.close()
+        os.replace(self.path + '.tmp', self.path)
+
+    def abort(self):
+        """Discards an unfinished output, leaving any existing file at path untouched."""
+        if self._file.closed: return
+        self._file.close(); os.remove(self.path + '.tmp')
+
+
+class FrontCodedReader:
+    """Memory-mapped random access to a .pfc wordlist: len(), indexing, membership, iteration and shards."""
+
+    def __init__(self, path):
+        self.path = path
+        self._file = open(path, 'rb')
+        try:
+            self._mmap = mmap.mmap(self._file.fileno(), 0, access=mmap.ACCESS_READ)
+            header, footer = FrontCodedWriter.HEADER, FrontCodedWriter.FOOTER
+            magic, self.block_size = header.unpack_from(self._mmap, 0)
+            self.count, table_offset, end_magic = footer.unpack_from(self._mmap, len(self._mmap) - footer.size)
+            if magic != FrontCodedWriter.MAGIC or end_magic != FrontCodedWriter.MAGIC: raise ValueError(f"{path} is not a .pfc wordlist")
+        except (ValueError, struct.error) as e: self._file.close(); raise ValueError(f"Cannot read {path}: {e}")
+        self._offsets = memoryview(self._mmap)[table_offset:len(self._mmap) - footer.size].cast('Q')
+        self._cached = (None, None)
+
+    def __enter__(self): return self
+
+    def __exit__(self, *exc_info): self.close()
+
+    def __len__(self): return self.count
+
+    def _decode_block(self, block):
+        """Returns the words of one block (the last decoded block is cached)."""
+        if self._cached[0] == block: return self._cached[1]
+        data = self._mmap; pos = self._offsets[block]
+        length, pos = _decode_varint(data, pos); previous = data[pos:pos + length]; pos += length
+        words = [previous]
+        for _ in range(min(self.block_size, self.count - block * self.block_size) - 1):
+            shared, pos = _decode_varint(data, pos); length, pos = _decode_varint(data, pos)
+            previous = previous[:shared] + data[pos:pos + length]; pos += length
+            words.append(previous)
+        words = [word.decode('utf-8') for word in words]
+        self._cached = (block, words)
+        return words
+
+    def __getitem__(self, index):
+        if index < 0: index += self.count
+        if not 0 <= index < self.count: raise IndexError("word index out of range")
+        return self._decode_block(index // self.block_size)[index % self.block_size]
+
+    def __contains__(self, word):
+        # Bisect on each block's first word (stored whole), then search inside one block
+        lo, hi = 0, len(self._offsets)
+        while lo < hi:
+            mid = (lo + hi) // 2
+            if self[mid * self.block_size] <= word: lo = mid + 1
+            else: hi = mid
+        return lo > 0 and word in self._decode_block(lo - 1)
+
+    def iter_range(self, start=0, stop=None):
+        """Yields the words with indices in [start, stop), decoding block by block."""
+        stop = self.count if stop is None else min(stop, self.count)
+        for block in range(start // self.block_size, -(-stop // self.block_size)):
+            first = block * self.block_size
+            yield from self._decode_block(block)[max(start - first, 0):stop - first]
+
+    def __iter__(self): return self.iter_range()
+
+    def shard(self, index, count):
+        """Yields shard index (0-based) of count near-equal, contiguous shards."""
+        return self.iter_range(self.count * index // count, self.count * (index + 1) // count)
+
+    def close(self):
+        self._offsets.release(); self._mmap.close(); self._file.close()
+
+
+def decode_wordlist(args):
+    """Writes the words (or one --shard) of a .pfc wordlist to the output. Returns the number written."""
+    with FrontCodedReader(args.decode) as reader:
+        index, count = args.shard or (1, 1)
+        log.info(f"Decoding {args.decode}: {len(reader)} words{f', shard {index}/{count}' if args.shard else ''}")
+        with open_output(args.output_file, args.pipe) as out: written = write_candidates(out, reader.shard(index - 1, count))
+    log.info(f"Wrote {written} words to {args.pipe or args.output_file or 'stdout'}")
+    return written
+
+
+# --- Hash Audit (--audit-hashes) ---
+def _md4(data):
+    """Pure-Python MD4 (RFC 1320), for NTLM when hashlib's OpenSSL build has no md4."""
+    message = bytearray(data) + b'\x80'
+    message += b'\0' * (-(len(message) + 8) % 64) + struct.pack('<Q', (8 * len(data)) & 0xFFFFFFFFFFFFFFFF)
+    state = [0x67452301, 0xEFCDAB89, 0x98BADCFE, 0x10325476]
+    rotl = lambda x, n: ((x << n) | (x >> (32 - n))) & 0xFFFFFFFF
+    for offset in range(0, len(message), 64):
+        x = struct.unpack_from('<16I', message, offset); a, b, c, d = state
+        for i in range(16): a, b, c, d = d, rotl((a + ((b & c) | (~b & d)) + x[i]) & 0xFFFFFFFF, (3, 7, 11, 19)[i % 4]), b, c
+        for i in range(16): a, b, c, d = d, rotl((a + ((b & c) | (b & d) | (c & d)) + x[(i % 4) * 4 + i // 4] + 0x5A827999) & 0xFFFFFFFF, (3, 5, 9, 13)[i % 4]), b, c
+        for i in range(16): a, b, c, d = d, rotl((a + (b ^ c ^ d) + x[(0, 8, 4, 12, 2, 10, 6, 14, 1, 9, 5, 13, 3, 11, 7, 15)[i]] + 0x6ED9EBA1) & 0xFFFFFFFF, (3, 9, 11, 15)[i % 4]), b, c
+        state = [(s + v) & 0xFFFFFFFF for s, v in zip(state, (a, b, c, d))]
+    return struct.pack('<4I', *state)
+
+
+@functools.lru_cache(maxsize=None)
+def _digest_function(algorithm):
+    """Returns a bytes -> digest function for md4/md5/sha1/sha256."""
+    if algorithm == 'md4':
+        try: hashlib.new('md4', b'')
+        except ValueError:
+            log.warning("hashlib has no md4 (OpenSSL 3 without the legacy provider); falling back to a pure-Python MD4, which is far slower.")
+            return _md4
+        return lambda data: hashlib.new('md4', data).digest()
+    constructor = getattr(hashlib, algorithm)
+    return lambda data: constructor(data).digest()
+
+
+class HashIndex:
+    """Target digests of an --audit-hashes file, indexed by salt (b'' when unsalted).
+
+    Unsalted lines are "hash" or "user:...:hash" (pwdump lines work; the last
+    field that is a digest of the right size is used). Salted lines are
+    "hash:salt" or "user:hash:salt".
+    """
+
+    def __init__(self, hash_type):
+        algorithm, _, self.salt_order = hash_type.partition('-')
+        self.hash_type = hash_type; self.algorithm = 'md4' if algorithm == 'ntlm' else algorithm
+        self.encoding = 'utf-16-le' if algorithm == 'ntlm' else 'utf-8'
+        self.hex_size = 32 if self.algorithm == 'md4' else 2 * hashlib.new(self.algorithm).digest_size
+        _digest_function(self.algorithm) # Resolved before the hashing pool forks, so a slow md4 fallback is reported once
+        self.by_salt = {} # salt -> {digest: [user labels]}
+        self.count = 0
+
+    @classmethod
+    def load(cls, path, hash_type):
+        index = cls(hash_type); skipped = 0
+        with open(path, 'r', encoding='utf-8', errors='replace') as f:
+            for line in f:
+                line = line.strip()
+                if line and not line.startswith('#') and not index.add(line): skipped += 1
+        if skipped: log.warning(f"Skipped {skipped} lines of {path} that are not {hash_type} hashes")
+        if not index.count: raise ValueError(f"No {hash_type} hashes found in {path}")
+        return index
+
+    def _is_digest(self, field):
+        return len(field) == self.hex_size and all(c in string.hexdigits for c in field)
+
+    def add(self, line):
+        """Adds one hash file line. Returns False if it holds no usable hash."""
+        fields = line.split(':')
+        if self.salt_order:
+            if len(fields) < 2 or not self._is_digest(fields[-2]): return False
+            digest, salt = fields[-2], fields[-1].encode('utf-8'); user = fields[0] if len(fields) > 2 else None
+        else:
+            digests = [f for f in fields if self._is_digest(f)]
+            if not digests: return False
+            digest, salt = digests[-1], b''; user = fields[0] if len(fields) > 1 else None
+        users = self.by_salt.setdefault(salt, {}).setdefault(bytes.fromhex(digest), [])
+        if not users: self.count += 1
+        users.append(user)
+        return True
+
+    def match(self, candidates):
+        """Hashes candidates once per salt. Returns [(candidate, salt, digest)] for the target digests."""
+        digest_of = _digest_function(self.algorithm); encoded = [c.encode(self.encoding) for c in candidates]; found = []
+        for salt, targets in self.by_salt.items():
+            if not salt: data = encoded
+            elif self.salt_order == 'pass-salt': data = [e + salt for e in encoded]
+            else: data = [salt + e for e in encoded]
+            for candidate, item in zip(candidates, data):
+                digest = digest_of(item)
+                if digest in targets: found.append((candidate, salt, digest))
+        return found
+
+
+_audit_state = {}
+
+def _audit_worker_init(index):
+    """Pool initializer: keeps the hash index in the worker process."""
+    _audit_state['index'] = index
+
+def _audit_batch_task(batch):
+    """Hashes one batch. Returns (pid, candidates hashed, CPU seconds, matches)."""
+    start = time.process_time()
+    matches = _audit_state['index'].match(batch)
+    return os.getpid(), len(batch), time.process_time() - start, matches
+
+
+def run_audit(generator, args):
+    """Hashes the generated candidates and writes the cracked hashes to the output. Returns the number cracked.
+
+    The pool of --hash-workers processes is started before generation and fed
+    batches from the main process, with a bounded number of batches in flight.
+    The default generation mode streams unsorted candidates (see candidates()).
+    No wordlist is written; the run stops early once every hash is cracked.
+    """
+    index = HashIndex.load(args.audit_hashes, args.hash_type)
+    workers = args.hash_workers or os.cpu_count() or 1
+    log.info(f"Auditing {index.count} {args.hash_type} hashes ({len(index.by_salt)} salt(s)) from {args.audit_hashes} with {workers} hashing process(es)")
+    cracked = set(); hashed = 0; cpu = collections.defaultdict(lambda: [0, 0.0]); start = time.perf_counter()
+    pool = multiprocessing.Pool(workers, initializer=_audit_worker_init, initargs=(index,)) if workers > 1 else None
+    if pool is None: _audit_worker_init(index)
+    try:
+        candidates = generator.candidates(ordered=False) # Sorting only delays the first batch
+        if candidates is None: return 0
+        batches = iter(functools.partial(lambda it: list(itertools.islice(it, AUDIT_BATCH_SIZE)), iter(candidates)), [])
+        with open_output(args.output_file, args.pipe) as out:
+            def record(result):
+                nonlocal hashed
+                pid, count, seconds, matches = result
+                hashed += count; cpu[pid][0] += count; cpu[pid][1] += seconds
+                for candidate, salt, digest in matches:
+                    if (salt, digest) in cracked: continue
+                    cracked.add((salt, digest))
+                    for user in dict.fromkeys(index.by_salt[salt][digest]): # Repeated lines of the same hash are written once
+                        out.write(":".join(f for f in (user, digest.hex(), salt.decode('utf-8') if index.salt_order else None, candidate) if f is not None) + "\n")
+                    out.flush()
+            if pool is None:
+                for batch in batches:
+                    record(_audit_batch_task(batch))
+                    if len(cracked) == index.count: break
+            else:
+                pending = collections.deque()
+                for batch in batches:
+                    pending.append(pool.apply_async(_audit_batch_task, (batch,)))
+                    if len(pending) >= 4 * workers: record(pending.popleft().get()) # Backpressure on generation
+                    if len(cracked) == index.count: break
+                while pending: record(pending.popleft().get())
+    finally:
+        if pool is not None: pool.terminate(); pool.join()
+    elapsed = time.perf_counter() - start; cpu_seconds = sum(s for _, s in cpu.values())
+    for pid, (count, seconds) in sorted(cpu.items()): log.debug(f"Hashing process {pid}: {count} candidates in {seconds:.2f}s CPU ({count / seconds if seconds else 0:,.0f}/s)")
+    accounts = sum(len(index.by_salt[salt][digest]) for salt, digest in cracked)
+    log.info(f"Audit finished: {len(cracked)}/{index.count} hashes cracked ({accounts} accounts), {hashed} candidates in {elapsed:.2f}s "
+             f"({hashed / elapsed if elapsed else 0:,.0f}/s overall, {hashed / cpu_seconds if cpu_seconds else 0:,.0f}/s per core)")
+    if len(cracked) == index.count: log.info("Every hash was cracked; generation stopped early.")
+    return len(cracked)
+
+
+# --- Batch Mode (--targets) ---
+def load_targets(path):
+    """Reads target records from a JSONL or CSV file. Returns a list of (target_id, fields) pairs."""
+    records = []
+    try:
+        with open(path, 'r', encoding='utf-8', newline='') as f:
+            if path.lower().endswith('.csv'): records = list(csv.DictReader(f))
+            else:
+                for line_no, line in enumerate(f, 1):
+                    if not line.strip() or line.lstrip().startswith('#'): continue
+                    try: records.append(json.loads(line))
+                    except ValueError as e: raise ValueError(f"{path} line {line_no}: invalid JSON ({e})")
+    except OSError as e: raise ValueError(f"Cannot read targets file {path}: {e}")
+    targets = []; used_ids = set(); unknown = set()
+    for index, record in enumerate(records, 1):
+        if not isinstance(record, dict): raise ValueError(f"{path} record {index}: expected an object")
+        fields = {}; target_id = None
+        for key, value in record.items():
+            key = str(key).strip().lower().replace('-', '_')
+            if value is None or value == '' or value == []: continue
+            if key == 'id': target_id = str(value); continue
+            if key not in TARGET_FIELDS: unknown.add(key); continue
+            if key == 'keyword': value = [k.strip() for k in value.split(';') if k.strip()] if isinstance(value, str) else [str(k) for k in value]
+            fields[key] = value
+        target_id = re.sub(r'[^\w.-]+', '_', target_id or f"target{index}")
+        while target_id in used_ids: target_id += '_' # Keep per-target file names unique
+        used_ids.add(target_id); targets.append((target_id, fields))
+    if unknown: log.warning(f"Ignoring unknown target field(s): {', '.join(sorted(unknown))}")
+    return targets
+
+_batch_state = {}
+
+def _batch_worker_init(args):
+    """Pool initializer: keeps the shared arguments and quiets per-target logging."""
+    _batch_state['args'] = args
+    log.setLevel(max(args.loglevel, logging.WARNING))
+
+def _batch_target_task(task):
+    """Generates one target's wordlist. Returns (target_id, count, seconds, path, error)."""
+    target_id, fields, path = task
+    target_args = argparse.Namespace(**vars(_batch_state['args']))
+    for key, value in fields.items(): setattr(target_args, key, value) # Record fields override command-line defaults
+    target_args.output_file = path; target_args.workers = 1; target_args.targets = None
+    start = time.perf_counter()
+    generator = None
+    try:
+        generator = PasswordGenerator(target_args)
+        count = generator.run_and_output() or 0
+        if generator.write_error: return target_id, 0, time.perf_counter() - start, path, generator.write_error
+    except Exception as e: return target_id, 0, time.perf_counter() - start, path, str(e)
+    finally:
+        if generator is not None: generator.close() # Releases the --exclude-wordlist mapping
+    return target_id, count, time.perf_counter() - start, path, None
+
+def run_batch(args):
+    """Runs every --targets record on a pool of --workers processes. Returns the number of failed targets.
+
+    The target-independent tables are built before the pool starts, so forked
+    workers inherit them. Each target goes to its own file in --output-dir, or
+    to a single stream (-o or stdout) with lines tagged "<target id>\\t<candidate>".
+    """
+    targets = load_targets(args.targets)
+    if not targets: log.warning(f"No targets found in {args.targets}."); return 0
+    forbid = frozenset(args.forbid_chars or '')
+    for parts in (INSERT_CHARS, tuple(DEFAULT_PREFIXES), tuple(SYMBOLS_COMMON)): part_table(parts, forbid)
+    log.info(f"Batch mode: {len(targets)} targets from {args.targets} on {args.workers} worker(s).")
+    if args.output_dir: os.makedirs(args.output_dir, exist_ok=True)
+    failed = 0; total = 0; start = time.perf_counter()
+    with tempfile.TemporaryDirectory(prefix='passforge-batch-') as tmpdir:
+        out_dir = args.output_dir or tmpdir
+        tasks = [(target_id, fields, os.path.join(out_dir, f"{target_id}.txt")) for target_id, fields in targets]
+        tagged = contextlib.nullcontext(None) if args.output_dir else open_output(args.output_file)
+        with tagged as out, multiprocessing.Pool(args.workers, initializer=_batch_worker_init, initargs=(args,)) as pool:
+            for target_id, count, seconds, path, error in pool.imap(_batch_target_task, tasks):
+                if error: failed += 1; log.error(f"Target {target_id} failed: {error}"); continue
+                total += count
+                log.info(f"Target {target_id}: {count} candidates in {seconds:.2f}s ({count / seconds if seconds else 0:,.0f}/s){' -> ' + path if args.output_dir and count else ''}")
+                if out is not None and count:
+                    with open(path, 'r', encoding='utf-8') as f:
+                        for line in f: out.write(f"{target_id}\t{line}")
+                    os.remove(path)
+    elapsed = time.perf_counter() - start
+    log.info(f"Batch finished: {len(targets) - failed}/{len(targets)} targets, {total} candidates in {elapsed:.2f}s ({total / elapsed if elapsed else 0:,.0f}/s overall).")
+    return failed
+
+
+# --- Generation Daemon (--serve) ---
+class ResultCache:
+    """Thread-safe LRU cache of encoded wordlists, bounded by their total size in bytes."""
+
+    def __init__(self, max_bytes):
+        self.max_bytes = max_bytes; self.size = 0; self.hits = self.misses = 0
+        self._entries = collections.OrderedDict(); self._lock = threading.Lock()
+
+    def get(self, key):
+        with self._lock:
+            body = self._entries.get(key)
+            if body is None: self.misses += 1; return None
+            self._entries.move_to_end(key); self.hits += 1
+            return body
+
+    def put(self, key, body):
+        if len(body) > self.max_bytes: return
+        with self._lock:
+            if key in self._entries: self.size -= len(self._entries.pop(key))
+            self._entries[key] = body; self.size += len(body)
+            while self.size > self.max_bytes: self.size -= len(self._entries.popitem(last=False)[1])
+
+    def stats(self):
+        with self._lock: return {'entries': len(self._entries), 'bytes': self.size, 'max_bytes': self.max_bytes, 'hits': self.hits, 'misses': self.misses}
+
+
+class GenerateHandler(http.server.BaseHTTPRequestHandler):
+    """HTTP API: POST /generate with a JSON profile streams the wordlist; GET /health and /stats."""
+    protocol_version = 'HTTP/1.1'
+    server_version = f"PassForge/{__version__}"
+
+    def log_message(self, format, *args): log.debug(f"{self.client_address[0]} {format % args}")
+
+    def _send_json(self, status, payload):
+        body = json.dumps(payload).encode('utf-8') + b"\n"
+        self.send_response(status); self.send_header('Content-Type', 'application/json')
+        self.send_header('Content-Length', str(len(body))); self.end_headers(); self.wfile.write(body)
+
+    def do_GET(self):
+        if self.path == '/health': self._send_json(200, {'status': 'ok', 'version': __version__})
+        elif self.path == '/stats': self._send_json(200, self.server.cache.stats())
+        else: self._send_json(404, {'error': 'not found'})
+
+    def do_POST(self):
+        if self.path != '/generate': self._send_json(404, {'error': 'not found'}); return
+        cache = self.server.cache; generator = None
+        try:
+            try:
+                body = self.rfile.read(int(self.headers.get('Content-Length') or 0))
+                config = GeneratorConfig.from_dict(json.loads(body or b'{}'), allowed=SERVE_FIELDS, base=self.server.base_config).normalized()
+                key = config.cache_key()
+                cached = cache.get(key)
+                if cached is not None:
+                    self.send_response(200); self.send_header('Content-Type', 'text/plain; charset=utf-8'); self.send_header('X-PassForge-Cache', 'hit')
+                    self.send_header('Content-Length', str(len(cached))); self.end_headers(); self.wfile.write(cached)
+                    log.info(f"Served {len(cached)} cached bytes to {self.client_address[0]}"); return
+                generator = PasswordGenerator(config)
+                candidates = generator.candidates() or []
+            except ValueError as e: self._send_json(400, {'error': str(e)}); return
+            self.send_response(200); self.send_header('Content-Type', 'text/plain; charset=utf-8'); self.send_header('X-PassForge-Cache', 'miss')
+            self.send_header('Transfer-Encoding', 'chunked'); self.end_headers()
+            parts = []; size = 0; count = 0
+            try:
+                for lines, text in iter_chunks(candidates):
+                    data = text.encode('utf-8'); count += lines
+                    self.wfile.write(b"%x\r\n%s\r\n" % (len(data), data))
+                    if parts is not None:
+                        parts.append(data); size += len(data)
+                        if size > cache.max_bytes: parts = None # Too large to cache; keep streaming
+                self.wfile.write(b"0\r\n\r\n")
+            except (BrokenPipeError, ConnectionResetError): log.warning(f"Client {self.client_address[0]} disconnected mid-stream."); return
+            if parts is not None: cache.put(key, b"".join(parts))
+            log.info(f"Streamed {count} candidates to {self.client_address[0]}")
+        finally:
+            if generator is not None: generator.close() # Releases the --exclude-wordlist mapping
+
+
+def serve(config, port, cache_bytes=DEFAULT_CACHE_SIZE, host='127.0.0.1'):
+    """Runs the local generation daemon until interrupted. config supplies the defaults for every request."""
+    server = http.server.ThreadingHTTPServer((host, port), GenerateHandler)
+    server.daemon_threads = True
+    server.base_config = dataclasses.replace(config, **{f: None for f in TARGET_FIELDS}, output_file=None, profile=None, workers=1)
+    server.cache = ResultCache(cache_bytes)
+    log.info(f"PassForge daemon listening on http://{host}:{server.server_address[1]} (cache: {cache_bytes} bytes)")
+    try: server.serve_forever()
+    except KeyboardInterrupt: log.info("Daemon stopped.")
+    finally: server.server_close()
+
+
+# --- Command Line ---
+def parse_size(value):
+    """argparse type for byte sizes such as 512M or 2G."""
+    match = re.fullmatch(r'\s*(\d+(?:\.\d+)?)\s*([KMGT]?)i?B?\s*', value, re.IGNORECASE)
+    if not match: raise argparse.ArgumentTypeError(f"invalid size: {value!r} (e.g. 512M, 2G)")
+    return int(float(match.group(1)) * 1024 ** " KMGT".index(match.group(2).upper() or ' '))
+
+
+def parse_char_classes(value):
+    """argparse type for --require-classes."""
+    classes = [c.strip().lower() for c in value.split(',') if c.strip()]
+    unknown = [c for c in classes if c not in CHAR_CLASSES]
+    if unknown: raise argparse.ArgumentTypeError(f"unknown character class(es): {', '.join(unknown)} (choose from {', '.join(CHAR_CLASSES)})")
+    return classes
+
+
+def parse_shard(value):
+    """argparse type for --shard K/N (1-based)."""
+    match = re.fullmatch(r'\s*(\d+)\s*/\s*(\d+)\s*', value)
+    if not match or not 1 <= int(match.group(1)) <= int(match.group(2)): raise argparse.ArgumentTypeError(f"invalid shard: {value!r} (use K/N with 1 <= K <= N, e.g. 2/8)")
+    return int(match.group(1)), int(match.group(2))
+
+
+def build_parser():
+    """Builds the command-line argument parser."""
     parser = argparse.ArgumentParser(
         description=f"PassForge v{__version__} - Personalized Password List Generator. Use Responsibly!",
         formatter_class=argparse.ArgumentDefaultsHelpFormatter
@@ -328,7 +2041,9 @@ if __name__ == "__main__":
     # Transformation Options
     trans_group = parser.add_argument_group('Transformation Options')
     trans_group.add_argument("--no-case", action="store_true", help="Disable case transformations")
-    trans_group.add_argument("--leet-level", choices=['none', 'simple', 'full'], default='none', help="Level of leet speak substitution")
+    trans_group.add_argument("--leet-level", choices=LEET_LEVELS, default='none', help="Level of leet speak substitution")
+    trans_group.add_argument("--leet-max-subs", type=int, default=DEFAULT_LEET_MAX_SUBS, help="Full leet: maximum substituted positions per variant (0 = no limit)")
+    trans_group.add_argument("--leet-max-variants", type=int, default=DEFAULT_LEET_MAX_VARIANTS, help="Full leet: maximum variants per word (0 = no limit)")
     trans_group.add_argument("--reverse", action="store_true", help="Include reversed versions of words")
     trans_group.add_argument("--no-numbers", action="store_true", help="Disable adding number suffixes/prefixes")
     trans_group.add_argument("--no-symbols", action="store_true", help="Disable adding symbol suffixes/prefixes")
@@ -341,32 +2056,100 @@ if __name__ == "__main__":
 
     # Output Options
     output_group = parser.add_argument_group('Output Options')
-    output_group.add_argument("-o", "--output-file", help="File to save the generated wordlist (Default: print to stdout)")
+    output_group.add_argument("-o", "--output-file", help="File to save the generated wordlist; .gz/.xz/.bz2 compress it, .pfc writes the front-coded binary format (Default: print to stdout)")
+    output_group.add_argument("--pipe", metavar="CMD", help="Feed the wordlist to the stdin of command CMD (e.g. a cracker) instead of writing it")
+    output_group.add_argument("--decode", metavar="FILE", help="Write the words of a .pfc wordlist to the output instead of generating")
+    output_group.add_argument("--shard", type=parse_shard, metavar="K/N", help="With --decode, output only the K-th of N equal contiguous slices")
     output_group.add_argument("--min-len", type=int, default=DEFAULT_MIN_LEN, help="Minimum length of passwords to include")
     output_group.add_argument("--max-len", type=int, default=DEFAULT_MAX_LEN, help="Maximum length of passwords to include")
+    output_group.add_argument("--require-classes", type=parse_char_classes, help=f"Comma-separated character classes every password must contain ({','.join(CHAR_CLASSES)})")
+    output_group.add_argument("--forbid-chars", help="Characters that must not appear in any password")
+    output_group.add_argument("--match-regex", help="Regular expression every password must match (re.search)")
+    output_group.add_argument("--targets", help="Batch mode: JSONL or CSV file of target records (id, first_name, birth_date, keyword, ...)")
+    output_group.add_argument("--output-dir", help="Batch mode: write one <id>.txt wordlist per target here (Default: one stream tagged with the target id)")
+    output_group.add_argument("--exclude-wordlist", metavar="FILE", help="Drop candidates that appear in this wordlist (indexed once on disk, memory-mapped at run time)")
+    output_group.add_argument("--exclude-index", metavar="PATH", help="Where to keep the --exclude-wordlist index (Default: FILE.pfx next to the wordlist)")
+    output_group.add_argument("--state", metavar="DIR", help="Keep an index of everything emitted for this profile in DIR and output only candidates not emitted before")
+    output_group.add_argument("--top", type=int, help="Output only the N most likely candidates, best first (ranked by stage weights)")
+    output_group.add_argument("--rank-weights", help="JSON file of stage weights in (0, 1] for --top, e.g. {\"leet\": 0.2, \"patterns\": 0.5}")
+    output_group.add_argument("--stream", action="store_true", help="Stream candidates as they are generated with bounded memory (unsorted; cross-word duplicates possible)")
+
+    # Performance Options
+    perf_group = parser.add_argument_group('Performance Options')
+    perf_group.add_argument("--stage-graph", metavar="FILE", help="JSON stage graph naming each stage's input stages, instead of feeding every stage all earlier output")
+    perf_group.add_argument("--profile", metavar="FILE", help="Write per-stage wall time, peak memory (tracemalloc) and candidate counts as JSON")
+    perf_group.add_argument("--estimate", action="store_true", help="Dry run: print per-stage candidate count estimates and exit without generating")
+    perf_group.add_argument("--max-candidates", type=int, help="Refuse to run when the estimated candidate count exceeds this budget")
+    perf_group.add_argument("--trim-stages", action="store_true", help="With --max-candidates, drop the most expensive stages until the estimate fits instead of refusing")
+    perf_group.add_argument("--mem-limit", type=parse_size, help="Memory budget for deduplication (e.g. 512M, 2G); sorted runs are spilled to temp files beyond it")
+    perf_group.add_argument("--workers", type=int, default=1, help="Number of worker processes (and dedupe partitions) for sharded generation")
+
+    # Daemon Options
+    daemon_group = parser.add_argument_group('Daemon Options')
+    daemon_group.add_argument("--serve", type=int, metavar="PORT", help="Run a local HTTP daemon on 127.0.0.1:PORT that streams wordlists for POSTed JSON profiles")
+    daemon_group.add_argument("--cache-size", type=parse_size, default=DEFAULT_CACHE_SIZE, help="Size bound (bytes, e.g. 256M) of the daemon's LRU result cache")
+
+    # Audit Options
+    audit_group = parser.add_argument_group('Audit Options')
+    audit_group.add_argument("--audit-hashes", metavar="FILE", help="Hash the candidates against the hashes in FILE and write only the cracked ones (user:hash[:salt]:password) instead of the wordlist")
+    audit_group.add_argument("--hash-type", choices=AUDIT_HASH_TYPES, help="Hash type of --audit-hashes; salted types hash password+salt (pass-salt) or salt+password (salt-pass)")
+    audit_group.add_argument("--hash-workers", type=int, help="Hashing processes for --audit-hashes (Default: CPU count; 1 hashes in the main process)")
 
     # Logging Arguments
     log_group = parser.add_argument_group('Logging Options')
     log_group.add_argument("-v", "--verbose", action="store_const", dest="loglevel", const=logging.DEBUG, default=logging.INFO, help="Enable verbose (debug) logging")
     log_group.add_argument("-q", "--quiet", action="store_const", dest="loglevel", const=logging.WARNING, help="Suppress informational messages (show warnings/errors only)")
     log_group.add_argument("--log-file", help="File to write detailed logs to")
+    return parser
 
 
+# --- Entry Point ---
+if __name__ == "__main__":
+    parser = build_parser()
     args = parser.parse_args()
 
     # --- Configure Logging ---
-    # (Same as v2.0)
-    log.setLevel(args.loglevel)
-    if args.log_file:
-        try:
-            file_handler = logging.FileHandler(args.log_file, mode='w')
-            file_formatter = logging.Formatter('%(asctime)s [%(levelname)s] %(message)s', datefmt='%Y-%m-%d %H:%M:%S')
-            file_handler.setFormatter(file_formatter); log.addHandler(file_handler)
-            log.info(f"Logging detailed output to: {args.log_file}")
-        except Exception as e: log.error(f"Failed to open log file {args.log_file}: {e}"); sys.exit(1)
+    try: configure_logging(args.loglevel, args.log_file)
+    except Exception as e: log.error(f"Failed to open log file {args.log_file}: {e}"); sys.exit(1)
     # --- End Logging Config ---
 
     # Validate inputs
+    if args.workers < 1: parser.error("--workers must be at least 1")
+    if args.output_dir and not args.targets: parser.error("--output-dir requires --targets")
+    if args.output_dir and args.output_file: parser.error("--output-dir cannot be combined with -o")
+    if args.targets and (args.estimate or args.profile): parser.error("--targets cannot be combined with --estimate or --profile")
+    if args.workers > 1 and args.stream and not args.targets: parser.error("--workers cannot be combined with --stream")
+    if args.top is not None and args.top < 1: parser.error("--top must be at least 1")
+    if args.leet_max_subs < 0 or args.leet_max_variants < 0: parser.error("--leet-max-subs and --leet-max-variants must be 0 (no limit) or more")
+    if args.max_candidates is not None and args.max_candidates < 1: parser.error("--max-candidates must be at least 1")
+    if (args.min_len is not None and args.min_len < 0) or (args.max_len is not None and args.max_len < 0): parser.error("--min-len and --max-len must not be negative")
+    if args.min_len is not None and args.max_len is not None and args.min_len > args.max_len: parser.error("--min-len is greater than --max-len")
+    if args.top and (args.stream or (args.workers > 1 and not args.targets) or args.mem_limit): parser.error("--top cannot be combined with --stream, --workers or --mem-limit")
+    if args.profile and (args.stream or args.workers > 1 or args.mem_limit or args.top): parser.error("--profile only applies to the default in-memory generation mode")
+    if args.state and (args.stream or args.top or args.workers > 1 or args.profile or args.targets or args.serve is not None): parser.error("--state cannot be combined with --stream, --top, --workers, --profile, --targets or --serve")
+    if args.stage_graph and (args.top or (args.workers > 1 and not args.targets) or args.state or args.estimate or args.max_candidates): parser.error("--stage-graph cannot be combined with --top, --workers, --state, --estimate or --max-candidates")
+    if args.mem_limit and args.stream: parser.error("--mem-limit cannot be combined with --stream (streamed output is not deduplicated)")
+    if args.pipe and (args.output_file or args.targets or args.serve is not None or args.estimate): parser.error("--pipe cannot be combined with -o, --targets, --serve or --estimate")
+    if bool(args.audit_hashes) != bool(args.hash_type): parser.error("--audit-hashes and --hash-type must be given together")
+    if args.hash_workers is not None and (args.hash_workers < 1 or not args.audit_hashes): parser.error("--hash-workers must be at least 1 and requires --audit-hashes")
+    if args.audit_hashes and (args.targets or args.serve is not None or args.estimate or args.decode or args.state or args.profile): parser.error("--audit-hashes cannot be combined with --targets, --serve, --estimate, --decode, --state or --profile")
+    if args.audit_hashes and args.output_file and args.output_file.lower().endswith('.pfc'): parser.error("--audit-hashes results cannot be written as .pfc")
+    if args.shard and not args.decode: parser.error("--shard requires --decode")
+    if args.output_file and args.output_file.lower().endswith('.pfc') and (args.stream or args.top or args.targets): parser.error(".pfc output needs sorted, unique candidates; it cannot be combined with --stream, --top or --targets")
+    if args.decode:
+        try: decode_wordlist(args); sys.exit(0)
+        except (ValueError, OSError) as e: log.critical(f"Decode Error: {e}"); sys.exit(1)
+    if args.exclude_index and not args.exclude_wordlist: parser.error("--exclude-index requires --exclude-wordlist")
+    if args.exclude_wordlist and (args.serve is not None or args.targets): # Build the index once, before workers or requests need it
+        try: ExclusionIndex.open(args.exclude_wordlist, args.exclude_index, args.mem_limit).close()
+        except OSError as e: log.critical(f"Exclusion Index Error: {e}"); sys.exit(1)
+    if args.serve is not None:
+        try: serve(GeneratorConfig.from_args(args), args.serve, args.cache_size); sys.exit(0)
+        except OSError as e: log.critical(f"Daemon Error: {e}"); sys.exit(1)
+    if args.targets:
+        try: sys.exit(1 if run_batch(args) else 0)
+        except (ValueError, OSError) as e: log.critical(f"Batch Error: {e}"); sys.exit(1)
+        except KeyboardInterrupt: log.warning("\nBatch run interrupted by user."); print("\nProcess aborted.", file=sys.stderr); sys.exit(1)
     if not any([args.first_name, args.last_name, args.username, args.nickname,
                 args.partner_name, args.pet_name, args.company, args.keyword, args.keyword_file]):
          log.warning("No personal information or keyword file provided. Wordlist may be very small or empty.")
@@ -375,7 +2158,11 @@ if __name__ == "__main__":
     generator = None
     try:
         generator = PasswordGenerator(args)
-        generator.run_and_output()
+        if args.estimate: generator.print_estimate()
+        elif args.audit_hashes:
+            try: run_audit(generator, args)
+            except (ValueError, OSError) as e: log.critical(f"Audit Error: {e}"); sys.exit(1)
+        else: generator.run_and_output()
 
     except ValueError as ve: log.critical(f"Initialization Error: {ve}"); sys.exit(1)
     except KeyboardInterrupt: log.warning("\nWordlist generation interrupted by user."); print("\nProcess aborted.", file=sys.stderr); sys.exit(1)
@@ -0,0 +1,234 @@
+# test_passforge.py
+"""Focused tests for the on-disk formats and helpers of passforge.py (run with pytest)."""
+import contextlib
+import json
+
+import pytest
+
+import passforge
+
+
+# --- Front-Coded Wordlists (.pfc) ---
+BLOCK = passforge.PFC_BLOCK_SIZE
+WORDS = sorted({f"{stem}{n}" for stem in ('john', 'johnny', 'doe', 'Doe!') for n in range(60)} | {'', 'é', 'zz'})
+
+
+def write_pfc(path, words=WORDS):
+    with passforge.open_output(str(path)) as out: return passforge.write_candidates(out, words)
+
+
+def test_pfc_round_trip(tmp_path):
+    path = tmp_path / 'words.pfc'
+    assert write_pfc(path) == len(WORDS)
+    with passforge.FrontCodedReader(str(path)) as reader:
+        assert len(reader) == len(WORDS) and list(reader) == WORDS
+
+
+def test_pfc_indexing_and_membership(tmp_path):
+    path = tmp_path / 'words.pfc'; write_pfc(path)
+    with passforge.FrontCodedReader(str(path)) as reader:
+        assert [reader[i] for i in range(len(WORDS))] == WORDS
+        assert reader[-1] == WORDS[-1] and reader[-len(WORDS)] == WORDS[0]
+        with pytest.raises(IndexError): reader[len(WORDS)]
+        assert all(word in reader for word in WORDS)
+        assert not any(word in reader for word in ('!', 'john', 'john600', 'johnz', 'zzz'))
+
+
+@pytest.mark.parametrize('count', [BLOCK, 2 * BLOCK, 4 * BLOCK, 4 * BLOCK + 1, 5 * BLOCK - 1])
+def test_pfc_shards_cut_at_block_boundaries(tmp_path, count):
+    words = [f"w{i:05d}" for i in range(count)]
+    path = tmp_path / 'words.pfc'; write_pfc(path, words)
+    with passforge.FrontCodedReader(str(path)) as reader:
+        for start in (0, BLOCK - 1, BLOCK, BLOCK + 1, 2 * BLOCK, count - 1):
+            for stop in (start, start + 1, BLOCK, 2 * BLOCK, count, count + BLOCK):
+                assert list(reader.iter_range(start, stop)) == words[start:stop]
+        for shards in (1, 2, 3, 4, 7):
+            parts = [list(reader.shard(i, shards)) for i in range(shards)]
+            assert sum(parts, []) == words and max(map(len, parts)) - min(map(len, parts)) <= 1
+
+
+def test_pfc_rejects_unsorted_input_without_leaving_output(tmp_path):
+    path = tmp_path / 'words.pfc'
+    with pytest.raises(ValueError): write_pfc(path, ['b', 'a'])
+    assert list(tmp_path.iterdir()) == []
+    write_pfc(path)
+    with pytest.raises(RuntimeError):
+        with passforge.FrontCodedWriter(str(path)) as writer: writer.write_words(['a']); raise RuntimeError
+    with passforge.FrontCodedReader(str(path)) as reader: assert list(reader) == WORDS # Earlier output kept
+
+
+@pytest.mark.parametrize('size', [0, 4, -1])
+def test_pfc_reader_rejects_incomplete_files(tmp_path, size):
+    path = tmp_path / 'words.pfc'; write_pfc(path)
+    data = path.read_bytes(); path.write_bytes(data[:size])
+    with pytest.raises(ValueError): passforge.FrontCodedReader(str(path))
+
+
+# --- Ranking Weights (--top) ---
+def test_rank_weights_override_defaults_and_reject_bad_values(tmp_path):
+    path = tmp_path / 'weights.json'
+    path.write_text('{"leet": 0.5}'); assert passforge.load_rank_weights(str(path))['leet'] == 0.5
+    for bad in ('{"leet": true}', '{"leet": 0}', '{"leet": 1.5}', '{"leet": "0.5"}', '{"nope": 0.5}', '[0.5]', '{'):
+        path.write_text(bad)
+        with pytest.raises(ValueError): passforge.load_rank_weights(str(path))
+
+
+# --- Incremental State (--state) ---
+def run_words(argv):
+    generator = passforge.PasswordGenerator(passforge.build_parser().parse_args(argv + ['--no-patterns', '-q']))
+    try:
+        candidates = list(generator.candidates() or ())
+        generator.commit_state()
+        return candidates
+    finally: generator.close()
+
+
+def test_fingerprint_index_and_bloom_filter(tmp_path):
+    fingerprints = sorted({passforge.fingerprint(f"w{i}") for i in range(5000)})
+    path = str(tmp_path / 'index.bin')
+    assert passforge.FingerprintIndex.write(path, fingerprints + fingerprints[-1:]) == len(fingerprints)
+    index = passforge.FingerprintIndex(path)
+    try:
+        assert list(index) == fingerprints and all(fp in index for fp in fingerprints)
+        assert passforge.fingerprint('absent') not in index
+    finally: index.close()
+    assert len(passforge.FingerprintIndex(str(tmp_path / 'missing.bin'))) == 0
+    bloom = passforge.BloomFilter.for_capacity(len(fingerprints))
+    for fp in fingerprints: bloom.add(fp)
+    bloom.save(str(tmp_path / 'bloom.bin'))
+    for loaded in (passforge.BloomFilter.load(str(tmp_path / 'bloom.bin')), passforge.BloomFilter.load(str(tmp_path / 'bloom.bin'), writable=False)):
+        assert all(fp in loaded for fp in fingerprints)
+        false_positives = sum(passforge.fingerprint(f"x{i}") in loaded for i in range(5000))
+        assert false_positives < 2 * 5000 * passforge.BLOOM_ERROR_RATE # Twice the configured false-positive rate
+
+
+def test_state_runs_are_disjoint_and_cover_the_full_run(tmp_path):
+    state = ['--state', str(tmp_path / 'state')]
+    profiles = [['--first-name', 'John'], # Single word: no combinations yet
+                ['--first-name', 'John', '--last-name', 'Doe'], # Second word enables combinations with the first
+                ['--first-name', 'John', '--last-name', 'Doe', '--pet-name', 'rex', '--birth-date', '1990-05-15'], # Birth date change regenerates
+                ['--first-name', 'John', '--last-name', 'Doe', '--pet-name', 'rex', '--birth-date', '1990-05-15', '-k', 'acme']]
+    seen = set()
+    for argv in profiles:
+        words = run_words(argv + state)
+        assert words == sorted(words) and seen.isdisjoint(words)
+        seen.update(words)
+        assert seen == set(run_words(argv)) # Together the runs emitted exactly the full wordlist
+    assert run_words(profiles[-1] + state) == []
+
+
+def fail_output_on_close(monkeypatch):
+    """Makes open_output() raise when the output is closed, after every candidate was handed over."""
+    real_open_output = passforge.open_output
+
+    @contextlib.contextmanager
+    def failing_open_output(*args):
+        with real_open_output(*args) as out: yield out
+        raise OSError("No space left on device")
+    monkeypatch.setattr(passforge, 'open_output', failing_open_output)
+    return real_open_output
+
+
+def test_state_is_not_updated_when_the_output_fails(tmp_path, monkeypatch):
+    argv = ['--first-name', 'John', '--no-patterns', '-q', '--state', str(tmp_path / 'state'), '-o', str(tmp_path / 'out.txt')]
+    real_open_output = fail_output_on_close(monkeypatch)
+    generator = passforge.PasswordGenerator(passforge.build_parser().parse_args(argv))
+    try: assert generator.run_and_output() is None
+    finally: generator.close()
+    monkeypatch.setattr(passforge, 'open_output', real_open_output)
+    assert run_words(argv[:-2]) == run_words(['--first-name', 'John']) # The retry still emits everything
+
+
+# --- Equivalent Modes ---
+# Every mode below promises exactly the candidates of the default in-memory run
+PROFILE = ['--first-name', 'John', '--last-name', 'Doe', '--birth-date', '1990-05-15', '--leet-level', 'simple', '--reverse']
+
+
+@pytest.mark.parametrize('mode', [['--workers', '3'], ['--mem-limit', '256K'], ['--workers', '2', '--mem-limit', '256K']])
+def test_sharded_and_spilling_runs_match_the_default_list(mode):
+    assert run_words(PROFILE + mode) == run_words(PROFILE)
+
+
+def test_stream_yields_the_default_set():
+    streamed = run_words(PROFILE + ['--stream'])
+    assert set(streamed) == set(run_words(PROFILE))
+
+
+@pytest.mark.parametrize('filters', [['--min-len', '8', '--max-len', '10'], ['--max-len', '6'], ['--require-classes', 'digit,symbol'],
+                                     ['--forbid-chars', '!0'], ['--match-regex', '^[A-Z]'], ['--min-len', '9', '--require-classes', 'upper,digit', '--forbid-chars', '@']])
+def test_early_pruning_matches_late_filtering(filters):
+    policy = passforge.PasswordPolicy.from_args(passforge.build_parser().parse_args(PROFILE + filters))
+    assert run_words(PROFILE + filters) == [word for word in run_words(PROFILE) if policy.accepts(word)]
+
+
+def test_full_chain_stage_graph_matches_the_default_pipeline(tmp_path):
+    stages = ['base', 'case', 'leet', 'reverse', 'insertions', 'affixes', 'patterns']
+    graph = {'stages': {stage: {'inputs': stages[:i]} for i, stage in enumerate(stages) if i}}; graph['stages']['combinations'] = {}
+    path = tmp_path / 'graph.json'; path.write_text(json.dumps(graph))
+    assert run_words(PROFILE + ['--stage-graph', str(path)]) == run_words(PROFILE)
+
+
+@pytest.mark.parametrize('mode', [[], ['--stream'], ['--mem-limit', '256K']])
+def test_exclude_wordlist_removes_exactly_the_listed_lines(tmp_path, mode):
+    full = run_words(PROFILE)
+    listed = full[::7] + ['not-a-candidate', full[3].upper() + 'x']
+    path = tmp_path / 'known.txt'; path.write_text("\n".join(listed) + "\n", encoding='utf-8')
+    words = run_words(PROFILE + mode + ['--exclude-wordlist', str(path)])
+    assert set(words) == set(full) - set(listed)
+
+
+# --- Generation Daemon (--serve) ---
+def test_generator_config_from_dict():
+    config = passforge.GeneratorConfig.from_dict({'first-name': 'John', 'keyword': ['b', 'a'], 'min_len': 6, 'leet_level': 'simple'})
+    assert (config.first_name, config.keyword, config.min_len, config.leet_level) == ('John', ['b', 'a'], 6, 'simple')
+    same = passforge.GeneratorConfig.from_dict({'first_name': ' John ', 'keyword': ['a', 'b', ' '], 'min_len': 6, 'leet_level': 'simple'})
+    assert config.normalized().cache_key() == same.normalized().cache_key()
+    for bad in ({'nope': 1}, {'min_len': True}, {'min_len': '6'}, {'keyword': [1]}, {'leet_level': 'max'}, {'reverse': 'yes'},
+                {'top': 0}, {'max_candidates': 0}, {'leet_max_subs': -1}, {'min_len': 9, 'max_len': 8}, ['first_name']):
+        with pytest.raises(ValueError): passforge.GeneratorConfig.from_dict(bad)
+    with pytest.raises(ValueError): passforge.GeneratorConfig.from_dict({'output_file': 'x.txt'}, allowed={'first_name'})
+
+
+def test_result_cache_evicts_least_recently_used_by_size():
+    cache = passforge.ResultCache(10)
+    cache.put('a', b'1234'); cache.put('b', b'1234'); cache.put('too-big', b'x' * 11)
+    assert cache.get('a') == b'1234' and cache.get('too-big') is None
+    cache.put('c', b'1234') # Evicts 'b', the least recently used
+    assert cache.get('b') is None and cache.get('c') == b'1234' and cache.get('a') == b'1234'
+    cache.put('a', b'12') # Replacing an entry releases its old size
+    assert cache.stats() == {'entries': 2, 'bytes': 6, 'max_bytes': 10, 'hits': 3, 'misses': 2}
+
+
+# --- Batch Mode (--targets) ---
+def test_batch_target_reports_write_errors_and_closes_its_generator(tmp_path, monkeypatch):
+    passforge._batch_worker_init(passforge.build_parser().parse_args(['--targets', 'targets.jsonl', '--no-patterns', '-q']))
+    closed = []; real_close = passforge.PasswordGenerator.close
+    monkeypatch.setattr(passforge.PasswordGenerator, 'close', lambda self: (closed.append(self), real_close(self)))
+    fail_output_on_close(monkeypatch)
+    target_id, count, _, _, error = passforge._batch_target_task(('a', {'first_name': 'John'}, str(tmp_path / 'a.txt')))
+    assert (target_id, count) == ('a', 0) and 'No space left on device' in error and len(closed) == 1
+
+
+# --- Hash Audit (--audit-hashes) ---
+@pytest.mark.parametrize('message, digest', [ # RFC 1320, appendix A.5
+    (b"", '31d6cfe0d16ae931b73c59d7e0c089c0'),
+    (b"a", 'bde52cb31de33e46245e05fbdbd6fb24'),
+    (b"abc", 'a448017aaf21d8525fc10ae87aa6729d'),
+    (b"message digest", 'd9130a8164549fe818874806e1c7014b'),
+    (b"abcdefghijklmnopqrstuvwxyz", 'd79e1c308aa5bbcdeea8ed63df412da9'),
+    (b"ABCDEFGHIJKLMNOPQRSTUVWXYZabcdefghijklmnopqrstuvwxyz0123456789", '043f8582f241db351ce627e153e7f0e4'),
+    (b"1234567890" * 8, 'e33b4ddc9c38f2199c3e7b164fcc0536'),
+])
+def test_md4_matches_rfc_1320(message, digest):
+    assert passforge._md4(message).hex() == digest
+    assert passforge._digest_function('md4')(message).hex() == digest
+
+
+def test_md4_ntlm():
+    assert passforge._md4('password'.encode('utf-16-le')).hex() == '8846f7eaee8fb117ad06bdd830b7586c'
+
+
+@pytest.mark.skipif(passforge._digest_function('md4') is passforge._md4, reason="hashlib has no md4 to compare against")
+def test_md4_matches_hashlib_at_padding_boundaries():
+    for size in (55, 56, 63, 64, 65, 119, 120):
+        assert passforge._md4(b'x' * size) == passforge._digest_function('md4')(b'x' * size)